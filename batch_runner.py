@@ -0,0 +1,161 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import signal
+import threading
+import time
+from contextlib import redirect_stdout
+
+import flowpro
+
+# Run a plan of headless FlowPro tests, benches in parallel worker processes and each bench's tests one after another.
+# run with: python batch_runner.py plan.json
+#           python batch_runner.py plan.json --output-dir results --workers 4
+# plan.json:
+#   {"output_dir": "results",
+#    "defaults": {"interval": 0.5, "pressure_unit": "psi", "flow_unit": "l/m", "duration": 60},
+#    "tests": [{"master": "192.168.1.10", "filename": "valve-001"},
+#              {"master": "192.168.1.11", "filename": "valve-002", "triggers": ["rate:pressure:5"]}]}
+# test keys are the --headless config keys: flowpro.HEADLESS_SETTINGS
+
+# ---------- Plan ----------
+
+def load_plan(path): # (output_dir, [test settings]) with the defaults merged into every test
+    with open(path, "r") as f:
+        plan = json.load(f)
+    if isinstance(plan, list):
+        plan = {"tests": plan}
+    defaults = plan.get("defaults", {})
+    tests = []
+    for i, test in enumerate(plan.get("tests", [])):
+        settings = dict(defaults, **test)
+        unknown = set(settings) - set(flowpro.HEADLESS_SETTINGS)
+        if unknown:
+            raise ValueError(f"Test {i+1} has unknown settings: {', '.join(sorted(unknown))}")
+        if settings.get("duration") is None and settings.get("count") is None:
+            raise ValueError(f"Test {i+1} needs a duration or a count, a batch cannot wait for Ctrl+C")
+        settings.setdefault("filename", f"test-{i+1:03d}")
+        tests.append(settings)
+    return plan.get("output_dir", "."), tests
+
+
+def group_by_master(tests): # {master: [tests]} in plan order, one worker per bench
+    benches = {}
+    for test in tests:
+        benches.setdefault(test.get("master") or "discover", []).append(test)
+    return benches
+
+# ---------- Worker ----------
+
+def ignore_interrupt(): # idle workers ignore Ctrl+C, run_headless installs its own stop handler while a test runs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def achieved_hz(result): # samples per second on the tick grid, teardown and the xlsx export are not part of the run
+    if result.get("span"):
+        return (result["samples"] - 1) / result["span"]
+    return result["samples"] / result["seconds"] if result.get("seconds") else None
+
+
+def run_bench(master, tests, output_dir): # worker process: run one bench's tests in order through the headless path
+    stop_event = threading.Event()
+    results = []
+    log_path = os.path.join(output_dir, f"{master.replace(':', '_')}.log")
+    with open(log_path, "w", buffering=1) as log, redirect_stdout(log):
+        if master == "discover":
+            master = flowpro.find_master()
+        if master is None:
+            print("Could not locate IFM master.")
+            return [dict(test=t["filename"], master=None, error="master not found", log=log_path) for t in tests]
+        flowpro.url = "http://" + str(master)
+        for test in tests:
+            if stop_event.is_set(): # Ctrl+C during an earlier test, skip the rest of the bench
+                results.append(dict(test=test["filename"], master=master, error="skipped after stop", log=log_path))
+                continue
+            output = os.path.join(output_dir, test.get("output") or test["filename"] + ".xlsx")
+            print(f"---------- {test['filename']} on {master} ----------")
+            started = time.time()
+            try:
+                result = flowpro.run_headless(test, output=output, duration=test.get("duration"), count=test.get("count"),
+                                              stop_event=stop_event)
+            except Exception as e: # a failing test should not end the bench
+                print(f"Test {test['filename']} failed: {e!r}")
+                result = None
+                error = repr(e)
+            else:
+                error = (result["error"] if result else "no sensors found") # a sampler failure ends the test early
+            if result:
+                result["hz"] = achieved_hz(result)
+            results.append(dict(result or {}, test=test["filename"], master=master, started=started,
+                                target_hz=1/float(test["interval"]) if float(test.get("interval") or 0) > 0 else None,
+                                error=error, log=log_path))
+            flowpro.perf = flowpro.PerfMonitor() # the next test's perf report starts empty, only the first one includes discovery
+            flowpro.last_discovery.update(method=None, ip=None, mac=None, seconds=None)
+    return results
+
+# ---------- Summary ----------
+
+def format_size(size):
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def print_summary(results):
+    print(f"\n{'Test':<24} {'Master':<20} {'Samples':>8} {'Hz':>8} {'Target':>8} {'Missed':>7} {'Errors':>7} {'File':>10}  Status")
+    for r in results:
+        target = f"{r['target_hz']:.2f}" if r.get("target_hz") else "-"
+        hz = f"{r['hz']:.2f}" if r.get("hz") is not None else "-"
+        print(f"{r['test']:<24} {str(r['master']):<20} {r.get('samples', 0):>8} {hz:>8} {target:>8} {r.get('missed', 0):>7} "
+              f"{r.get('errors', 0):>7} {format_size(r.get('file_bytes')):>10}  {r['error'] or 'ok'}")
+    done = [r for r in results if not r["error"]]
+    print(f"{len(done)}/{len(results)} tests completed, {sum(r.get('missed', 0) for r in done)} missed deadlines, "
+          f"{format_size(sum(r.get('file_bytes') or 0 for r in done))} recorded")
+
+
+def run(plan_path, output_dir=None, workers=None): # run the whole plan and return every test's result
+    plan_dir, tests = load_plan(plan_path)
+    output_dir = output_dir or plan_dir
+    os.makedirs(output_dir, exist_ok=True)
+    benches = group_by_master(tests)
+    print(f"{len(tests)} tests on {len(benches)} benches, logs and recordings in {os.path.abspath(output_dir)}")
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers or len(benches), initializer=ignore_interrupt) as pool:
+        futures = {pool.submit(run_bench, master, bench_tests, output_dir): master for master, bench_tests in benches.items()}
+        pending = set(futures)
+        while pending:
+            try:
+                done, pending = concurrent.futures.wait(pending, timeout=1.0)
+            except KeyboardInterrupt: # the workers got the same signal, each saves its current test and skips the rest
+                print("Stopping, waiting for every bench to save its current test...")
+                continue
+            for future in done:
+                master = futures[future]
+                try:
+                    bench_results = future.result()
+                except Exception as e:
+                    bench_results = [dict(test=t["filename"], master=master, error=f"worker failed: {e!r}") for t in benches[master]]
+                print(f"Bench {master} finished {sum(1 for r in bench_results if not r['error'])}/{len(bench_results)} tests")
+                results += bench_results
+
+    names = [t["filename"] for t in tests]
+    results.sort(key=lambda r: names.index(r["test"]) if r["test"] in names else len(names))
+    with open(os.path.join(output_dir, "batch_summary.json"), "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print_summary(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a plan of headless FlowPro tests in parallel, one worker per bench")
+    parser.add_argument("plan", help="json test plan")
+    parser.add_argument("--output-dir", help="where recordings, logs and batch_summary.json go (overrides the plan)")
+    parser.add_argument("--workers", type=int, help="parallel benches, defaults to one per master in the plan")
+    args = parser.parse_args()
+    results = run(args.plan, args.output_dir, args.workers)
+    raise SystemExit(0 if all(not r["error"] for r in results) else 1)
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+
+import matplotlib
+matplotlib.use("Agg") # redraw timings without a window
+import numpy as np
+
+import flowpro
+import master_sim
+
+# Repeatable performance benchmarks against the local master simulator, results are written as JSON so runs can be diffed.
+# run with: python benchmark.py --output bench.json
+#           python benchmark.py --quick                      (shorter runs for a smoke test)
+#           python benchmark.py --ping-subnet 192.168.1.0/24 (also time the legacy threaded_find_master on a real network)
+
+# ---------- Globals ----------
+SIM_BASE_PORT = 18000
+SIM_LATENCY_MS = 2.0
+SIM_JITTER_MS = 0.5
+SIM_PORTS = [2015, 452, 1463, None]
+DECODER_CHECK_WIDTHS = [1, 2, 4, 6, 8, 12, 16] # random payload widths the batch decoders are checked against the scalar ones on
+
+# ---------- Helpers ----------
+
+def summarize(samples): # latency summary in milliseconds
+    values = np.asarray(samples, dtype=float) * 1000
+    if len(values) == 0:
+        return {"count": 0}
+    return {"count": int(len(values)), "mean_ms": float(values.mean()), "p50_ms": float(np.percentile(values, 50)),
+            "p90_ms": float(np.percentile(values, 90)), "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+
+
+def timed(func, *args, **kwargs): # (seconds, result)
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+# ---------- Benchmarks ----------
+
+def bench_discovery(ping_subnet=None, hosts=16): # time-to-discovery of the async engine on simulated masters, and optionally the legacy ping scan
+    results = {}
+    addresses, masters, stop = master_sim.run_in_thread(count=1, base_port=SIM_BASE_PORT+500, spread=True, device_ids=SIM_PORTS)
+    try:
+        subnet = f"127.0.0.0/{32 - max(2, (hosts-1).bit_length())}"
+        seconds, found = timed(flowpro.async_find_master, subnet, port=SIM_BASE_PORT+500, overall_timeout=5)
+        results["async_find_master"] = {"subnet": subnet, "seconds": seconds, "found": found}
+        seconds, found = timed(flowpro.async_find_all_masters, [subnet], port=SIM_BASE_PORT+500, overall_timeout=5)
+        results["async_find_all_masters"] = {"subnet": subnet, "seconds": seconds, "found": len(found)}
+    finally:
+        stop()
+    if ping_subnet:
+        seconds, found = timed(flowpro.threaded_find_master, ping_subnet)
+        results["threaded_find_master"] = {"subnet": ping_subnet, "seconds": seconds, "found": found}
+    else:
+        results["threaded_find_master"] = {"skipped": "pass --ping-subnet to time the ping + arp scan on a real network"}
+    return results
+
+
+def bench_port_reads(reads): # round-trip latency of single port reads and of one batched read of all active ports
+    single = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        flowpro.read_pdin(1)
+        single.append(time.perf_counter() - start)
+    active = [n+1 for n, device_id in enumerate(SIM_PORTS) if device_id]
+    batched = []
+    for _ in range(reads):
+        start = time.perf_counter()
+        flowpro.read_ports(active)
+        batched.append(time.perf_counter() - start)
+    return {"single_port": summarize(single), "all_active_ports": dict(summarize(batched), ports=len(active))}
+
+
+def bench_burst(seconds): # samples/s and tick jitter the sampler thread reaches at burst rates and with no interval at all
+    ports = [flowpro.deviceIDs.get(device_id) if device_id else None for device_id in SIM_PORTS]
+    results = {}
+    for name, interval in (("burst_0.1s", 0.1), ("burst_0.02s", 0.02), ("unthrottled", 0.0)):
+        stats = {"missed": 0, "errors": 0, "error": None, "finished": False, "started": None}
+        stop_event = threading.Event()
+        flowpro.current_interval = interval
+        flowpro.running = True
+        channels = flowpro.build_channels(ports, 1, 0, "psi", "l/m")
+        ring = flowpro.SampleRing(len(channels))
+        scheduler = flowpro.TickScheduler(interval)
+        sampler = threading.Thread(target=flowpro.sampler_loop, args=(ring, channels, stop_event, stats, scheduler), daemon=True)
+        sampler.start()
+        cursor = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline: # drain like the GUI would so the unthrottled run is not held back
+            cursor = ring.read_since(cursor)[0]
+            time.sleep(0.01)
+        stop_event.set()
+        sampler.join()
+        flowpro.running = False
+        results[name] = {"interval": interval, "samples": ring.written, "hz": ring.written/seconds,
+                         "missed_deadlines": stats["missed"], "errors": stats["errors"], "jitter": scheduler.jitter_stats()}
+    return results
+
+
+def bench_decoders(count): # scalar vs batch decode throughput, and the largest batch/scalar mismatch
+    payloads = {
+        "decodePressureIFM": [master_sim.encodePressureIFM(b) for b in np.random.uniform(0, 10, count)],
+        "decodeFlowKey": [master_sim.encodeFlowKey(f) for f in np.random.uniform(-20, 60, count)],
+        "decodeFlowIFM": [master_sim.encodeFlowIFM(f, total=i) for i, f in enumerate(np.random.uniform(0, 60, count))],
+    }
+    results = {}
+    for name, raw_values in payloads.items():
+        decoder = getattr(flowpro, name)
+        scalar_seconds, _ = timed(lambda: [decoder(raw_hex) for raw_hex in raw_values])
+        batch_seconds, _ = timed(flowpro.BATCH_DECODERS[decoder], raw_values)
+        widths = {f"{width}_bytes": flowpro.check_batch_decoder(decoder, [os.urandom(width).hex().upper() for _ in range(200)])
+                  for width in DECODER_CHECK_WIDTHS} # short payloads must fail alike, wide ones must not overflow the batch path
+        max_abs_diff = flowpro.check_batch_decoder(decoder, raw_values[:1000])
+        results[name] = {"scalar_ops_per_s": count/scalar_seconds, "batch_ops_per_s": count/batch_seconds,
+                         "max_abs_diff": max_abs_diff, "payload_widths": widths,
+                         "matches_scalar": max_abs_diff == 0.0 and all(diff == 0.0 for diff in widths.values())}
+        if not results[name]["matches_scalar"]:
+            print(f"WARNING: {name} batch decoder does not match the scalar decoder: {widths}")
+    return results
+
+
+def bench_recorders(checkpoints, block=10): # per-row cost as the recording grows, plus the final xlsx export
+    results = {}
+    header = ["Time Stamp", "Elapsed Time (s)", "Pressure (psi)", "Flow Rate (l/m)"]
+    meta_rows = [["Test Name", "benchmark"], ["Test Start", "now"]]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, ext in (("StreamRecorder", ".xlsx"), ("ColumnarRecorder", ".fpr")):
+            recorder = flowpro.open_recorder(os.path.join(tmp, "bench"+ext), meta_rows, header)
+            curve = []
+            written = 0
+            wall = time.time()
+            for checkpoint in checkpoints:
+                start = time.perf_counter()
+                rows_here = 0
+                while written < checkpoint:
+                    recorder.write_rows([[wall + (written+i)*0.5, (written+i)*0.5, 50.0, 12.0] for i in range(block)])
+                    written += block
+                    rows_here += block
+                seconds = time.perf_counter() - start
+                curve.append({"rows": written, "us_per_row": seconds/max(rows_here, 1)*1e6})
+            close_seconds, _ = timed(recorder.close)
+            results[name] = {"per_row": curve, "close_seconds": close_seconds,
+                             "file_bytes": os.path.getsize(recorder.file_path)}
+    return results
+
+
+def bench_redraw(point_counts, repeats=5): # full canvas redraw time of the live plot lines as the point count grows
+    import matplotlib.pyplot as plt
+    results = []
+    for points in point_counts:
+        fig = plt.figure(figsize=(10, 5))
+        ax1 = fig.add_subplot(111)
+        ax2 = ax1.twinx()
+        x = np.arange(points) * 0.5
+        line_p, = ax1.plot(x, np.sin(x), marker="o", color="tab:blue", alpha=0.7)
+        line_f, = ax2.plot(x, np.cos(x), marker="o", color="tab:orange", alpha=0.7)
+        ax1.set_xlim(0, x[-1])
+        fig.canvas.draw()
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fig.canvas.draw()
+            times.append(time.perf_counter() - start)
+        plt.close(fig)
+        results.append(dict(summarize(times), points=points))
+    return results
+
+
+def run(quick=False, ping_subnet=None):
+    addresses, masters, stop = master_sim.run_in_thread(count=1, base_port=SIM_BASE_PORT, device_ids=SIM_PORTS,
+                                                       latency_ms=SIM_LATENCY_MS, jitter_ms=SIM_JITTER_MS)
+    flowpro.url = "http://" + addresses[0]
+    report = {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                       "platform": platform.platform(), "quick": quick,
+                       "simulator": {"latency_ms": SIM_LATENCY_MS, "jitter_ms": SIM_JITTER_MS, "ports": SIM_PORTS}}}
+    try:
+        report["discovery"] = bench_discovery(ping_subnet)
+        report["port_reads"] = bench_port_reads(50 if quick else 500)
+        report["burst"] = bench_burst(1.0 if quick else 5.0)
+        report["decoders"] = bench_decoders(10000 if quick else 200000)
+        report["recorders"] = bench_recorders([1000, 10000] if quick else [1000, 10000, 100000, 300000])
+        report["redraw"] = bench_redraw([300, 3000] if quick else [300, 3000, 30000, 100000])
+    finally:
+        stop()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FlowPro performance benchmarks")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--quick", action="store_true", help="short runs, for a smoke test")
+    parser.add_argument("--ping-subnet", help="also time threaded_find_master on this subnet (needs a real network)")
+    args = parser.parse_args()
+
+    report = run(args.quick, args.ping_subnet)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+        print(f"Wrote {args.output}")
+    else:
+        print(text)
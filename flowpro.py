@@ -1,32 +1,58 @@
+import time
+MODULE_START = time.perf_counter()
 import requests
 import threading
 import ipaddress
-import matplotlib.pyplot as plt
-from openpyxl.styles import Alignment
-from matplotlib.widgets import Button
 from datetime import datetime
-import pandas as pd
-import time
-from matplotlib.gridspec import GridSpec
-import tkinter as tk
-from tkinter import ttk, font, messagebox, filedialog
+import csv
+import argparse
+import collections
+import importlib
 import sys
 import os
-from contextlib import suppress
+from contextlib import suppress, contextmanager
 import concurrent.futures
 import subprocess
-from PIL import Image, ImageTk
-import os
+import signal
+import socket
+import queue
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+
+class LazyModule: # stands in for a heavy module until first use, so discovery can start before the plotting/excel/gui stacks load
+    def __init__(self, name, alias):
+        self._name = name
+        self._alias = alias
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        globals()[self._alias] = module # later lookups go straight to the real module
+        return getattr(module, attr)
+
+np = LazyModule("numpy", "np")
+plt = LazyModule("matplotlib.pyplot", "plt")
+widgets = LazyModule("matplotlib.widgets", "widgets")
+gridspec = LazyModule("matplotlib.gridspec", "gridspec")
+tk = LazyModule("tkinter", "tk")
+ttk = LazyModule("tkinter.ttk", "ttk")
+messagebox = LazyModule("tkinter.messagebox", "messagebox")
+filedialog = LazyModule("tkinter.filedialog", "filedialog")
+Image = LazyModule("PIL.Image", "Image")
+ImageTk = LazyModule("PIL.ImageTk", "ImageTk")
+
+HEADLESS_MODULES = ["numpy", "openpyxl"] # all --headless needs, no gui or plotting stacks
+HEAVY_MODULES = ["numpy", "matplotlib.pyplot", "matplotlib.widgets", "matplotlib.gridspec", "tkinter", "tkinter.ttk",
+                 "tkinter.messagebox", "tkinter.filedialog", "PIL.Image", "PIL.ImageTk", "openpyxl"]
 
 if getattr(sys, 'frozen', False):
     with suppress(ModuleNotFoundError):
         import pyi_splash
 
+# faster launching build: pyinstaller flowpro_onedir.spec (see the notes in that file)
 # reformat to exe with: pyinstaller --noconsole --onefile --icon="C:\Users\kbubn\OneDrive\Desktop\IPI\code\croppedlogo.ico" --splash="C:\Users\kbubn\OneDrive\Desktop\IPI\code\loading.png" C:\Users\kbubn\OneD
 # rive\Desktop\IPI\code\flowpro.py
 
-# TODO make saving compatable with multiple flow meters
-# TODO add a key for dual flow meters
 # TODO this may take up to x minutes on splash screen
 # TODO add working text on the splash screen
 # TODO update logo to the blue one, maybe swap sizes of flowpro and IPI names
@@ -38,23 +64,188 @@ url = ""
 current_interval = 10
 selected_interval = None
 burst_mode = False
-next_time = None
 port1 = None
 port2 = None
 port3 = None
 port4 = None
+raw_capture = None      # RawCapture logging every master reply (--capture)
+replay_source = None    # ReplaySource answering master requests from a capture (--replay)
 TARGET_MAC_PREFIX = "00:02:01"
 MAX_WORKERS = 50       # number of concurrent ping threads
 BATCH_SIZE = 200        # how many IPs to schedule before checking ARP table
 OVERALL_TIMEOUT = 20.0  # seconds to give up scanning the whole subnet
 PING_TIMEOUT_MS = 700   # per-ping timeout in milliseconds (Windows uses ms)
+DISCOVERY_MODE = "async" # "async" for the in-process probe engine, "ping" for the legacy ping + arp scan
+MASTER_HTTP_PORT = 80   # port the IFM master serves its JSON interface on
+ASYNC_WORKERS = 256     # number of concurrent in-process probes for async discovery
+MAX_BACKOFF = 30.0      # longest pause (s) before retrying a master that keeps failing in AsyncAcquisition
+PROBE_TIMEOUT = 0.6     # seconds allowed per TCP connect / JSON reply during async discovery
+DEVICEID_PROBE = {"code":"request","cid":-1,"adr":"/iolinkmaster/port[1]/iolinkdevice/deviceid/getdata"}
 PORT1_PAYLOAD = {"code": "request","cid":-1,"adr":"/iolinkmaster/port[1]/iolinkdevice/pdin/getdata"}
 PORT2_PAYLOAD = {"code": "request","cid":-1,"adr":"/iolinkmaster/port[2]/iolinkdevice/pdin/getdata"}
 PORT3_PAYLOAD = {"code": "request","cid":-1,"adr":"/iolinkmaster/port[3]/iolinkdevice/pdin/getdata"}
 PORT4_PAYLOAD = {"code": "request","cid":-1,"adr":"/iolinkmaster/port[4]/iolinkdevice/pdin/getdata"}
+PORT_PAYLOADS = {1: PORT1_PAYLOAD, 2: PORT2_PAYLOAD, 3: PORT3_PAYLOAD, 4: PORT4_PAYLOAD}
+HTTP_TIMEOUT = 2.0      # seconds allowed for any single request to the master
+PUSH_MODE = False       # have the master push pdin to a local listener on its timer instead of polling it (--push)
+PUSH_LISTEN_PORT = 0    # tcp port of the push listener, 0 picks any free port (--push-port)
+PUSH_LEASE = 60         # seconds each subscription lasts, renewed at half-time
+PUSH_RETRY = 5.0        # seconds between resubscribe attempts while polling after a lapse
+PUSH_LAPSE = 3          # timer intervals without a push before falling back to polling (at least 1s)
+STREAM_PORT = None      # serve live samples to other people on the bench on this port, None disables it (--stream)
+STREAM_HOST = "127.0.0.1" # "0.0.0.0" to let the rest of the LAN connect (--stream-host)
+STREAM_QUEUE = 1000     # samples buffered per subscriber, a slower client loses the oldest instead of stalling acquisition
+STREAM_KEEPALIVE = 15.0 # seconds of silence before a keep-alive comment is sent to a subscriber
+HTTP_POOL_SIZE = 8      # keep-alive connections kept open to the master
+MULTI_UNSUPPORTED_CODES = (400, 404, 405, 501) # getdatamulti replies that switch to per-port reads for good, other failures only for that read
+IDENTIFY_TIMEOUT = 1.0  # seconds allowed for each port's device id request when the settings window opens
+RATE_REPORT_INTERVAL = 10.0 # seconds between achieved samples/sec reports in live_plot
+HEADLESS_DRAIN_INTERVAL = 0.1 # seconds between moves of the ring into the recording in --headless mode
+PERF_OVERLAY = False    # draw achieved Hz, per-stage p50/p99 and missed deadlines on the figure (--perf-overlay)
+PERF_DUMP = True        # write the per-stage timings next to the recording as <name>_perf.json at the end of a test
+PERF_OVERLAY_INTERVAL = 1.0 # seconds between overlay refreshes
+RING_SIZE = 4096        # samples held between the sampler thread and the GUI
+BURST_INTERVAL = 0.1    # seconds between samples while burst mode is on (--burst-rate)
+ADAPTIVE_TRIGGERS = []  # trigger specs that switch to burst automatically, e.g. ["rate:pressure:5", "band:flow:2:20"] (--trigger)
+PRE_TRIGGER = 5.0       # seconds before a trigger that are kept at the burst rate
+POST_TRIGGER = 5.0      # seconds of burst rate kept after the last trigger before dropping back to the base interval
+SPIN_MARGIN = 0.016 if sys.platform == "win32" else 0.002 # last stretch before a tick is yielded away instead of slept, windows sleeps in ~15ms steps
+JITTER_WINDOW = 10000   # latest tick delays kept for the scheduler's jitter statistics
+FRAME_INTERVAL = 0.05   # seconds between GUI redraws, independent of the sample interval
+RENDER_MODE = "blit"    # "blit" redraws only the lines and readouts over a cached background, "full" redraws the whole figure
+PLOT_WINDOW = 300       # samples shown in "Show latest points"
+MAX_PLOT_POINTS = 2000  # most vertices drawn per line in "Show all points", roughly two per pixel column
+XLIM_HEADROOM = 0.25    # fraction of the visible span added past the newest sample whenever the x axis has to move
+FSYNC_INTERVAL = 5.0    # seconds between fsyncs of the streaming recording, bounds what a crash can lose
+KEEP_CSV = False        # keep the streaming .csv next to the .xlsx after a successful export
+FPR_MAGIC = b"FLOWPRO1"  # first bytes of a .fpr columnar recording
+IMPORT_PROFILE_FILE = "flowpro_import_profile.txt" # --profile-imports report, written next to the frozen exe
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 SUBNET = "192.168.1.0/24"
 #SUBNET = "10.0.0.0/24"
+SUBNETS = [SUBNET]      # every subnet/CIDR searched by async_find_all_masters, e.g. ["192.168.1.0/24", "10.0.0.0/24"]
+CACHE_PATH = os.path.join(os.environ.get("APPDATA", os.path.expanduser("~")), "FlowPro", "discovery_cache.json")
+CACHE_TTL = 7*24*3600   # seconds before a cached master is ignored and the subnet is rescanned
+CACHE_REVALIDATE_TIMEOUT = 0.5 # seconds allowed for the single revalidation request to a cached master
+last_discovery = {"method": None, "ip": None, "mac": None, "seconds": None} # filled in by the discovery functions
+
+# ---------- Startup ----------
+
+def preload_heavy_modules(modules=HEAVY_MODULES): # import the gui, plotting and excel stacks on a background thread while discovery runs
+    def load():
+        for name in modules:
+            with suppress(Exception):
+                importlib.import_module(name)
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
+
+
+def profile_imports(): # --profile-imports: cold import time of each heavy module, in the order the app needs them
+    lines = [f"flowpro module loaded in {(time.perf_counter()-MODULE_START)*1000:.1f} ms (heavy stacks not loaded yet)"]
+    total = 0.0
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        seconds = time.perf_counter() - start
+        total += seconds
+        lines.append(f"{seconds*1000:8.1f} ms  {name}")
+    lines.append(f"{total*1000:8.1f} ms  total, normally overlapped with discovery by preload_heavy_modules")
+    report = "\n".join(lines)
+    if sys.stdout is not None:
+        print(report)
+    if getattr(sys, 'frozen', False) or sys.stdout is None: # the windowed exe has no console, keep the report next to it
+        path = os.path.join(os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else BASE_DIR, IMPORT_PROFILE_FILE)
+        with open(path, "w") as f:
+            f.write(report + "\n")
+        if sys.stdout is None:
+            close_splash()
+            messagebox.showinfo("FlowPro import profile", f"{report}\n\nSaved to {path}")
+        else:
+            print(f"Saved to {path}")
+
+# ---------- Instrumentation ----------
+class LatencyHistogram: # log-spaced buckets from 1us to 100s, fixed memory however long the test runs
+    def __init__(self, buckets_per_decade=10):
+        self.edges = np.logspace(-6, 2, 8*buckets_per_decade + 1)
+        self.counts = np.zeros(len(self.edges) + 1, dtype=np.int64) # first and last catch anything outside the edges
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()        # discovery records from many worker threads at once
+
+    def add(self, seconds):
+        i = np.searchsorted(self.edges, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self): # consistent copy of (counts, count, total, max) while other threads keep adding
+        with self.lock:
+            return self.counts.copy(), self.count, self.total, self.max
+
+    def percentile(self, q, snapshot=None): # upper edge of the bucket holding the q-th percentile, never past the largest value seen
+        counts, count, _, largest = snapshot or self.snapshot()
+        if count == 0:
+            return None
+        i = int(np.searchsorted(np.cumsum(counts), q/100*count))
+        return min(float(self.edges[min(i, len(self.edges)-1)]), largest)
+
+    def summary(self, buckets=False): # milliseconds
+        snapshot = self.snapshot()
+        counts, count, total, largest = snapshot
+        if count == 0:
+            return {"count": 0}
+        result = {"count": count, "mean_ms": total/count*1000, "p50_ms": self.percentile(50, snapshot)*1000,
+                  "p90_ms": self.percentile(90, snapshot)*1000, "p99_ms": self.percentile(99, snapshot)*1000, "max_ms": largest*1000}
+        if buckets: # non-empty buckets as [upper edge ms, count]
+            upper = np.append(self.edges, np.inf) * 1000
+            result["histogram"] = [[float(upper[i]), int(c)] for i, c in enumerate(counts) if c]
+        return result
+
+
+class PerfMonitor: # per-stage timings of the hot path: discovery, network, decode, record, draw
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()        # guards creating a stage, each histogram locks its own updates (ping/arp come from many threads)
+
+    def record(self, stage, seconds):
+        hist = self.stages.get(stage)
+        if hist is None:
+            with self.lock:
+                hist = self.stages.setdefault(stage, LatencyHistogram())
+        hist.add(seconds)
+
+    @contextmanager
+    def time(self, stage): # with perf.time("decode"): ...
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def summary(self, buckets=False):
+        return {stage: hist.summary(buckets) for stage, hist in list(self.stages.items())}
+
+    def overlay_text(self, hz, missed, stages=("network", "decode", "record", "draw")): # short block of text for the figure
+        lines = [f"{hz:.1f} Hz   {missed} missed", "stage     p50 / p99 ms"]
+        for stage in stages:
+            hist = self.stages.get(stage)
+            if hist and hist.count:
+                lines.append(f"{stage:<8} {hist.percentile(50)*1000:6.2f} / {hist.percentile(99)*1000:6.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path, **extra): # every stage with its histogram plus whatever the caller adds, as json
+        report = dict(extra, stages=self.summary(buckets=True))
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Performance report saved to {path}")
+        return path
+
+
+perf = PerfMonitor()
 
 # ---------- Detecting IP ----------
 
@@ -74,30 +265,61 @@ def ping_ip(ip, timeout_ms=PING_TIMEOUT_MS): # ping a given ip
         return False
 
 
-def get_master_from_arp(prefix=TARGET_MAC_PREFIX): # check the arp list to see if master has been found
+def is_mac(token): # true if the token looks like a mac address (00-02-01-aa-bb-cc or 00:02:01:aa:bb:cc)
+    cleaned = token.replace("-", "").replace(":", "")
+    return len(cleaned) == 12 and all(c in "0123456789abcdefABCDEF" for c in cleaned) and cleaned != token
+
+
+def read_arp_table(): # read the arp/neighbour table once and return it as {ip: mac}
     try:
         arp_out = subprocess.check_output("arp -a", shell=True, text=True, stderr=subprocess.DEVNULL)
     except Exception:
-        return None, None
+        return {}
 
-    norm_prefix = prefix.lower().replace(":", "").replace("-", "")
+    table = {}
     for line in arp_out.splitlines():
-        cleaned = line.replace("-", "").replace(":", "").lower()
-        if norm_prefix in cleaned:
-            parts = line.split()
-            if len(parts) >= 2:
-                ip = None
-                mac = None
-                for token in parts:
-                    if token.count(".") == 3 and ip is None:
-                        ip = token.strip("()")
-                    if (":" in token or "-" in token) and any(c.isalpha() for c in token):
-                        mac = token
-                if ip and mac:
-                    return ip, mac
+        ip = None
+        mac = None
+        for token in line.split():
+            if token.strip("()").count(".") == 3 and ip is None:
+                ip = token.strip("()")
+            elif is_mac(token):
+                mac = token
+        if ip and mac:
+            table[ip] = mac
+    return table
+
+
+def mac_matches(mac, prefix=TARGET_MAC_PREFIX): # compare a mac against the IFM vendor prefix regardless of separator
+    norm_prefix = prefix.lower().replace(":", "").replace("-", "")
+    return mac.lower().replace(":", "").replace("-", "").startswith(norm_prefix)
+
+
+def get_master_from_arp(prefix=TARGET_MAC_PREFIX, table=None): # check the arp list to see if master has been found
+    if table is None:
+        table = read_arp_table()
+    for ip, mac in table.items():
+        if mac_matches(mac, prefix):
+            return ip, mac
     return None, None
 
 
+def splash_text(message): # show progress text on the pyinstaller splash screen
+    try:
+        if pyi_splash.is_alive():
+            pyi_splash.update_text(message)
+    except Exception as e:
+        pass
+
+
+def close_splash(): # close the pyinstaller splash screen once discovery is done
+    try:
+        if pyi_splash.is_alive():
+            pyi_splash.close()
+    except Exception as e:
+        pass
+
+
 def threaded_find_master(subnet=SUBNET, max_workers=MAX_WORKERS, # main function for finding IFM master's ip.
                          batch_size=BATCH_SIZE, overall_timeout=OVERALL_TIMEOUT): # pings each known subnet's ips to add to arp list, then checks arp list for master
     ip_list = build_ip_list(subnet)
@@ -111,8 +333,10 @@ def threaded_find_master(subnet=SUBNET, max_workers=MAX_WORKERS, # main function
     def ping_and_check(ip): # ping the passed ip and check if it matches required mac header.
         if found_event.is_set():
             return False
-        ping_ip(ip)
-        ip_found, mac_found = get_master_from_arp()
+        with perf.time("ping"):
+            ping_ip(ip)
+        with perf.time("arp"):
+            ip_found, mac_found = get_master_from_arp()
         if ip_found:
             found_result["ip"] = ip_found
             found_result["mac"] = mac_found
@@ -145,11 +369,11 @@ def threaded_find_master(subnet=SUBNET, max_workers=MAX_WORKERS, # main function
             concurrent.futures.wait(futures, timeout=timeout_left)
         except Exception:
             pass
-    try:
-        if pyi_splash.is_alive():
-            pyi_splash.close()
-    except Exception as e:
-        pass
+    close_splash()
+    elapsed = time.time() - start_time
+    last_discovery.update(method="ping", ip=found_result["ip"], mac=found_result["mac"], seconds=elapsed)
+    perf.record("discovery", elapsed)
+    print(f"Discovery (ping) finished in {elapsed:.2f}s")
 
     if found_result["ip"]: # if master is found, return its location so POST requests can be sent
         print("\nMATCH FOUND!")
@@ -160,6 +384,257 @@ def threaded_find_master(subnet=SUBNET, max_workers=MAX_WORKERS, # main function
         print("\n----- Unable to find any IFM Masters! -----")
         return None
 
+
+# ---------- Async Discovery ----------
+
+async def read_http_body(reader): # body of one http reply, up to its Content-Length or until the connection closes
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = None
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    if length is None:
+        return await reader.read()
+    return await reader.readexactly(length)
+
+
+async def probe_master(ip, port=MASTER_HTTP_PORT, timeout=PROBE_TIMEOUT): # tcp connect + deviceid request, returns latency in seconds if ip answers like an IO-Link master
+    body = json.dumps(DEVICEID_PROBE).encode()
+    request = (f"POST / HTTP/1.1\r\nHost: {ip}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode() + body
+    t0 = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    try:
+        writer.write(request)
+        await writer.drain()
+        reply_body = await asyncio.wait_for(read_http_body(reader), timeout)
+    except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        return None
+    finally:
+        writer.close()
+        with suppress(Exception):
+            await writer.wait_closed()
+
+    try:
+        reply_json = json.loads(reply_body)
+    except ValueError:
+        return None
+    if isinstance(reply_json, dict) and "code" in reply_json and "cid" in reply_json: # IFM JSON interface always echoes code + cid
+        return time.perf_counter() - t0
+    return None
+
+
+async def _async_scan(ip_list, port, concurrency, batch_size, overall_timeout, prefix): # probe every ip concurrently, stop on the first master
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    deadline = loop.time() + overall_timeout
+
+    async def limited_probe(ip):
+        async with sem:
+            return ip, await probe_master(ip, port)
+
+    pending = {asyncio.create_task(limited_probe(ip)) for ip in ip_list}
+    completed = 0
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                print("Overall timeout reached, stopping scan.")
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                ip, latency = task.result()
+                if latency is not None: # answered the JSON probe, that is a master
+                    table = await loop.run_in_executor(None, read_arp_table)
+                    return ip, table.get(ip)
+            completed += len(done)
+            if completed >= batch_size or not pending: # connect attempts fill the arp table, read it once per batch
+                completed = 0
+                ip_found, mac_found = get_master_from_arp(prefix, await loop.run_in_executor(None, read_arp_table))
+                if ip_found:
+                    return ip_found, mac_found
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None
+
+
+def async_find_master(subnet=SUBNET, port=MASTER_HTTP_PORT, concurrency=ASYNC_WORKERS, # in-process replacement for threaded_find_master
+                      batch_size=BATCH_SIZE, overall_timeout=OVERALL_TIMEOUT, prefix=TARGET_MAC_PREFIX): # no ping/arp processes per host
+    ip_list = build_ip_list(subnet)
+    print(f"Probing {len(ip_list)} addresses on {subnet} with up to {concurrency} concurrent connections...")
+
+    start_time = time.perf_counter()
+    ip_found, mac_found = asyncio.run(_async_scan(ip_list, port, concurrency, batch_size, overall_timeout, prefix))
+    elapsed = time.perf_counter() - start_time
+    close_splash()
+    last_discovery.update(method="async", ip=ip_found, mac=mac_found, seconds=elapsed)
+    perf.record("discovery", elapsed)
+    print(f"Discovery (async) finished in {elapsed:.2f}s")
+
+    if ip_found:
+        print("\nMATCH FOUND!")
+        print(f"IP:  {ip_found}")
+        print(f"MAC: {mac_found}")
+        return ip_found
+    else:
+        print("\n----- Unable to find any IFM Masters! -----")
+        return None
+
+
+
+async def _async_scan_all(subnets, port, concurrency, overall_timeout): # probe every host of every subnet under one concurrency budget
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    progress = {subnet: [0, len(build_ip_list(subnet))] for subnet in subnets}
+    found = []
+    last_update = [0.0]
+
+    def show_progress():
+        if loop.time() - last_update[0] < 0.25:
+            return
+        last_update[0] = loop.time()
+        splash_text("Scanning " + "  ".join(f"{subnet}: {done}/{total}" for subnet, (done, total) in progress.items()))
+
+    async def limited_probe(subnet, ip):
+        async with sem:
+            latency = await probe_master(ip, port)
+        progress[subnet][0] += 1
+        if latency is not None:
+            found.append({"ip": ip, "mac": None, "subnet": subnet, "latency": latency})
+        show_progress()
+
+    tasks = [asyncio.create_task(limited_probe(subnet, ip)) for subnet in subnets for ip in build_ip_list(subnet)]
+    done, pending = await asyncio.wait(tasks, timeout=overall_timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        print("Overall timeout reached, stopping scan.")
+
+    table = await loop.run_in_executor(None, read_arp_table) # one arp read for the whole scan
+    found_ips = set()
+    for master in found:
+        master["mac"] = table.get(master["ip"])
+        found_ips.add(master["ip"])
+    for ip, mac in table.items(): # ifm macs that did not answer the json probe are still reported
+        if ip in found_ips or not mac_matches(mac):
+            continue
+        for subnet in subnets:
+            if ipaddress.ip_address(ip) in ipaddress.ip_network(subnet, strict=False):
+                found.append({"ip": ip, "mac": mac, "subnet": subnet, "latency": None})
+                break
+    return found
+
+
+def async_find_all_masters(subnets=None, port=MASTER_HTTP_PORT, concurrency=ASYNC_WORKERS, overall_timeout=OVERALL_TIMEOUT): # find every IO-Link master on a list of subnets/CIDRs
+    subnets = subnets or SUBNETS
+    total = sum(len(build_ip_list(subnet)) for subnet in subnets)
+    print(f"Probing {total} addresses on {', '.join(subnets)} with up to {concurrency} concurrent connections...")
+
+    start_time = time.perf_counter()
+    masters = asyncio.run(_async_scan_all(subnets, port, concurrency, overall_timeout))
+    elapsed = time.perf_counter() - start_time
+    masters.sort(key=lambda m: float("inf") if m["latency"] is None else m["latency"])
+    last_discovery.update(method="async-all", ip=masters[0]["ip"] if masters else None,
+                          mac=masters[0]["mac"] if masters else None, seconds=elapsed)
+    perf.record("discovery", elapsed)
+    print(f"Discovery (async, all masters) finished in {elapsed:.2f}s")
+
+    for master in masters:
+        latency = "no reply" if master["latency"] is None else f"{master['latency']*1000:.1f} ms"
+        print(f"  {master['ip']:<16} {master['mac'] or '?':<18} {master['subnet']:<18} {latency}")
+    if not masters:
+        print("\n----- Unable to find any IFM Masters! -----")
+    return masters
+
+
+# ---------- Discovery Cache ----------
+
+def subnet_of(ip, subnets=None): # the entry of subnets (SUBNETS by default) that contains ip, None if none does
+    for subnet in subnets or SUBNETS:
+        if ipaddress.ip_address(ip) in ipaddress.ip_network(subnet, strict=False):
+            return subnet
+    return None
+
+
+def load_cached_master(subnets=None, ttl=CACHE_TTL): # return the cached master entry if it is fresh and on one of the searched subnets
+    try:
+        with open(CACHE_PATH, "r") as f:
+            entry = json.load(f)
+        ip = entry["ip"]
+        if time.time() - float(entry["timestamp"]) > ttl:
+            print("Cached master expired, rescanning.")
+            return None
+        if subnet_of(ip, subnets) is None:
+            return None
+        if entry.get("mac") and not mac_matches(entry["mac"]):
+            return None
+        return entry
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_cached_master(ip, mac, subnet=None): # remember the last discovered master for the next launch
+    entry = {"ip": ip, "mac": mac, "subnet": subnet or subnet_of(ip), "timestamp": time.time()}
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        with open(CACHE_PATH, "w") as f:
+            json.dump(entry, f)
+    except OSError as e:
+        print(f"Could not write discovery cache: {e}")
+
+
+def clear_cached_master(): # drop the cache so the next launch rescans
+    with suppress(OSError):
+        os.remove(CACHE_PATH)
+
+
+def revalidate_master(ip, timeout=CACHE_REVALIDATE_TIMEOUT): # single JSON request to confirm a cached ip is still an IO-Link master
+    try:
+        reply_json = master_post(DEVICEID_PROBE, timeout=timeout, base_url="http://"+str(ip), check_status=False)
+        return isinstance(reply_json, dict) and "code" in reply_json and "cid" in reply_json
+    except (requests.exceptions.RequestException, ValueError):
+        return False
+
+
+def rescan_requested(): # force a full scan with --rescan on the command line or FLOWPRO_RESCAN=1
+    return "--rescan" in sys.argv or os.environ.get("FLOWPRO_RESCAN") == "1"
+
+
+def find_master(mode=None, force_rescan=None): # try the cached master first, then pick the discovery path (DISCOVERY_MODE unless overridden)
+    if force_rescan is None:
+        force_rescan = rescan_requested()
+    if force_rescan: # --rescan forgets the cached master even if this scan finds nothing
+        clear_cached_master()
+    else:
+        start_time = time.perf_counter()
+        cached = load_cached_master()
+        if cached and revalidate_master(cached["ip"]):
+            elapsed = time.perf_counter() - start_time
+            close_splash()
+            last_discovery.update(method="cache", ip=cached["ip"], mac=cached.get("mac"), seconds=elapsed)
+            perf.record("discovery", elapsed)
+            print(f"Cached master {cached['ip']} answered in {elapsed:.2f}s, skipping scan.")
+            return cached["ip"]
+        elif cached:
+            print(f"Cached master {cached['ip']} did not answer, rescanning.")
+
+    if (mode or DISCOVERY_MODE) == "ping":
+        found = threaded_find_master(SUBNETS[0]) # read at call time, --subnet replaces SUBNETS after the defaults are bound
+    elif len(SUBNETS) > 1: # several benches, use the lowest latency master
+        masters = async_find_all_masters(SUBNETS)
+        close_splash()
+        found = masters[0]["ip"] if masters else None
+    else:
+        found = async_find_master(SUBNETS[0])
+    if found:
+        save_cached_master(found, last_discovery["mac"])
+    return found
+
 # ---------- Decoders ----------
 
 def decodePressureIFM(raw_hex): # decode raw hex data from IFM pressure sensor PN-7692
@@ -188,6 +663,246 @@ def decodeFlowIFM(raw_hex): # decode raw hex data from IFM flow meter
     G_min = L_min * 0.2641720524
     return [L_min, G_min]
 
+# ---------- Batch Decoders ----------
+def hex_batch(raw_values): # equal-length hex strings, bytes, or an (n, nbytes) uint8 array -> (n, nbytes) uint8 array
+    if isinstance(raw_values, np.ndarray) and raw_values.dtype == np.uint8:
+        return raw_values.reshape(len(raw_values), -1)
+    raw_values = list(raw_values)
+    if not raw_values:
+        return np.zeros((0, 0), dtype=np.uint8)
+    if isinstance(raw_values[0], (bytes, bytearray)):
+        joined = b"".join(raw_values)
+    else:
+        joined = bytes.fromhex("".join(raw_values))
+    if len(joined) % len(raw_values):
+        raise ValueError("batch decoders need payloads of equal length")
+    return np.frombuffer(joined, dtype=np.uint8).reshape(len(raw_values), -1)
+
+
+def bit_field(payloads, start, stop): # bits [start:stop) of each payload, counted from the msb like the scalar decoders' string slices
+    if len(payloads) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    stop = min(stop, payloads.shape[1]*8)
+    if stop <= start: # the slice is empty for payloads this short, the scalar decoders fail on int('', 2) the same way
+        raise ValueError(f"{payloads.shape[1]} byte payloads have no bits {start}:{stop}")
+    first, last = start // 8, (stop + 7) // 8
+    if last - first > 8: # wider than a uint64, use python ints so the float rounding matches the scalar decoders
+        shift, mask = last*8 - stop, (1 << (stop - start)) - 1
+        return np.array([float((int.from_bytes(row[first:last].tobytes(), "big") >> shift) & mask) for row in payloads])
+    value = np.zeros(len(payloads), dtype=np.uint64)
+    for i in range(first, last):
+        value = (value << np.uint64(8)) | payloads[:, i].astype(np.uint64)
+    value >>= np.uint64(last*8 - stop)
+    return value & np.uint64((1 << (stop - start)) - 1)
+
+
+def decodePressureIFMBatch(raw_values): # vectorized decodePressureIFM, returns (n, 3) array of [bar, psi, Kpa]
+    payloads = hex_batch(raw_values)
+    bar = bit_field(payloads, 2, payloads.shape[1]*8 - 2).astype(float)/10
+    return np.column_stack([bar, bar * 14.5038, bar * 100])
+
+
+def decodeFlowKeyBatch(raw_values): # vectorized decodeFlowKey, returns (n, 2) array of [L_min, G_min]
+    L_min = bit_field(hex_batch(raw_values), 0, 32).astype(float)/100
+    L_min = np.where(L_min > 100, L_min - 42949672.96, L_min) # same sign wrap as the scalar decoder
+    return np.column_stack([L_min, L_min*0.264172])
+
+
+def decodeFlowIFMBatch(raw_values): # vectorized decodeFlowIFM, returns (n, 2) array of [L_min, G_min]
+    L_min = bit_field(hex_batch(raw_values), 32, 64).astype(float)/60
+    return np.column_stack([L_min, L_min * 0.2641720524])
+
+
+BATCH_DECODERS = {decodePressureIFM: decodePressureIFMBatch, decodeFlowKey: decodeFlowKeyBatch, decodeFlowIFM: decodeFlowIFMBatch}
+
+def check_batch_decoder(decoder, raw_values): # largest difference between a batch decoder and its scalar version over raw_values, inf unless both fail alike
+    try:
+        scalar = np.array([decoder(raw_hex) for raw_hex in raw_values], dtype=float)
+    except ValueError:
+        scalar = None
+    try:
+        batch = BATCH_DECODERS[decoder](raw_values)
+    except ValueError:
+        batch = None
+    if scalar is None or batch is None:
+        return 0.0 if scalar is None and batch is None else float("inf")
+    return float(np.max(np.abs(batch - scalar))) if len(scalar) else 0.0
+
+# ---------- Master Transport ----------
+_session = None
+_getdatamulti_supported = True
+_port_pool = None
+
+def get_session(): # one pooled keep-alive session shared by every request to the master
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def port_pool(): # shared worker threads for concurrent per-port requests
+    global _port_pool
+    if _port_pool is None:
+        _port_pool = concurrent.futures.ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE)
+    return _port_pool
+
+
+def master_post(payload, timeout=HTTP_TIMEOUT, base_url=None, check_status=True): # send a JSON request to the master and return the decoded reply
+    if replay_source is not None:
+        return replay_source.reply(payload)
+    response = get_session().post(base_url or url, json=payload, timeout=timeout)
+    if check_status:
+        response.raise_for_status()
+    resp_json = response.json()
+    if raw_capture is not None:
+        raw_capture.write(payload, resp_json)
+    return resp_json
+
+
+def read_pdin(portNum): # read the raw pdin hex of a single port
+    resp_json = master_post(PORT_PAYLOADS[portNum])
+    return resp_json.get("data", {}).get("value")
+
+
+def read_ports(portNums): # read pdin of every listed port in one round-trip, returns {portNum: raw_hex}
+    global _getdatamulti_supported
+    if not portNums:
+        return {}
+    if _getdatamulti_supported:
+        adrs = {f"/iolinkmaster/port[{n}]/iolinkdevice/pdin": n for n in portNums}
+        payload = {"code": "request", "cid": -1, "adr": "/getdatamulti", "data": {"datatosend": list(adrs)}}
+        try:
+            resp_json = master_post(payload)
+        except requests.exceptions.HTTPError as e: # rejected at the http level, answer like a json error reply
+            resp_json = {"code": e.response.status_code if e.response is not None else None}
+        if resp_json.get("code") == 200:
+            values = {}
+            for adr, n in adrs.items():
+                entry = resp_json.get("data", {}).get(adr, {})
+                values[n] = entry.get("data") if entry.get("code") == 200 else None # a failed port becomes nan, the others are kept
+            return values
+        if resp_json.get("code") in MULTI_UNSUPPORTED_CODES:
+            print("Master does not support getdatamulti, reading ports concurrently instead.")
+            _getdatamulti_supported = False
+
+    futures = {n: port_pool().submit(read_pdin, n) for n in portNums} # one request per port, all in flight at once
+    return {n: future.result() for n, future in futures.items()}
+
+# ---------- Capture / Replay ----------
+class ReplayFinished(Exception): # every recorded process data reply has been replayed
+    pass
+
+
+class RawCapture: # append every master request/reply pair with its time stamp to a json lines file
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a", buffering=1) # line buffered, a crash or kill loses at most the line being written
+        self.lock = threading.Lock()
+
+    def write(self, payload, reply):
+        line = json.dumps({"t": time.time(), "request": payload, "reply": reply})
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ReplaySource: # answer master_post from a RawCapture file, paced like the original run or as fast as possible
+    def __init__(self, path, realtime=True):
+        self.realtime = realtime
+        self.queues = {}                    # request key -> deque of (t, reply) in recorded order
+        self.lock = threading.Lock()
+        self.reference = None               # (monotonic now, recorded t) of the first process data reply
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.queues.setdefault(self.key(entry["request"]), collections.deque()).append((entry["t"], entry["reply"]))
+
+    @staticmethod
+    def key(payload):
+        adr = payload.get("adr", "")
+        if adr == "/getdatamulti":
+            return adr + "|" + ",".join(payload.get("data", {}).get("datatosend", []))
+        return adr
+
+    def reply(self, payload):
+        key = self.key(payload)
+        stream = "/pdin" in key
+        with self.lock:
+            queue = self.queues.get(key)
+            if queue is None: # never recorded, answer like a master that does not know the request
+                return {"cid": -1, "code": 400}
+            if not queue:
+                raise ReplayFinished("End of capture reached")
+            t, reply = queue.popleft() if stream or len(queue) > 1 else queue[0] # identification replies repeat the last one
+            if stream and self.reference is None:
+                self.reference = (time.monotonic(), t)
+        if stream and self.realtime:
+            wait = (t - self.reference[1]) - (time.monotonic() - self.reference[0])
+            if wait > 0:
+                time.sleep(wait)
+        return reply
+
+# ---------- Device Detection ----------
+deviceIDs = { # device id: [name, type code, image, decoder]
+    2015: ["Keyence FD-H20 Flow Meter", "f","images/key_flow_img.jpg", decodeFlowKey],
+    1463: ["SU8021 IFM Flow Meter", "f","images/ifm_flow_img.jpg", decodeFlowIFM],
+    452:  ["PN7692 IFM Pressure Sensor", "p","images/ifm_pressure_img.jpg", decodePressureIFM],
+    1313: ["EIO344 IFM Moneo Blue|Classic Adapter", None,"images/ifm_moneo_img.jpg", None],
+    2016: ["Keyence FD-H20 Flow Meter", "f", "images/key_flow_img.jpg", decodeFlowKey]
+}
+
+device_cache = {}   # (master url, port) -> deviceIDs entry, filled by identify_port
+image_cache = {}    # (image file, size) -> resized PIL image, one per deviceIDs entry
+
+def findDevice(portNum, base_url=None, timeout=HTTP_TIMEOUT):
+    try:
+        payload = {"code":"request","cid":-1,
+                   "adr":f"/iolinkmaster/port[{portNum}]/iolinkdevice/deviceid/getdata"}
+        json_data = master_post(payload, timeout=timeout, base_url=base_url)
+        id_val = json_data.get("data", {}).get("value")
+        return deviceIDs.get(id_val)
+    except Exception as e:
+        print(f"Port {portNum} detection failed: {e}")
+        return None
+
+
+def read_device(portNum, base_url=None, timeout=HTTP_TIMEOUT): # (answered, deviceIDs entry): answered is False only when the deviceid read itself failed
+    payload = {"code": "request", "cid": -1, "adr": f"/iolinkmaster/port[{portNum}]/iolinkdevice/deviceid/getdata"}
+    try:
+        json_data = master_post(payload, timeout=timeout, base_url=base_url)
+    except (requests.exceptions.RequestException, ValueError):
+        return False, None
+    return True, deviceIDs.get(json_data.get("data", {}).get("value"))
+
+
+def identify_port(portNum, base_url=None): # findDevice on a worker thread, returns a future; known devices are cached per master and port
+    key = (base_url or url, portNum)
+    if key in device_cache:
+        future = concurrent.futures.Future()
+        future.set_result(device_cache[key])
+        return future
+
+    def identify():
+        device = findDevice(portNum, base_url, timeout=IDENTIFY_TIMEOUT)
+        if device: # empty ports and failed reads are asked again next time
+            device_cache[key] = device
+        return device
+    return port_pool().submit(identify)
+
+
+def device_image(img_file, size): # decode and resize a device picture once, later calls reuse it
+    key = (img_file, size)
+    if key not in image_cache:
+        image_cache[key] = Image.open(resource_path(img_file)).resize((size, size))
+    return image_cache[key]
+
 # ---------- Pyinstaller Pathing -----------
 def resource_path(relative_path):
     if hasattr(sys, 'frozen'):
@@ -200,30 +915,12 @@ def resource_path(relative_path):
 def combinedWindow():
     global BASE_DIR, url
 
-    # ------------------- Device Detection -------------------
-    def findDevice(portNum):
-        deviceIDs = {
-            2015: ["Keyence FD-H20 Flow Meter", "f","images/key_flow_img.jpg"],
-            1463: ["SU8021 IFM Flow Meter", "f","images/ifm_flow_img.jpg"],
-            452:  ["PN7692 IFM Pressure Sensor", "p","images/ifm_pressure_img.jpg"],
-            1313: ["EIO344 IFM Moneo Blue|Classic Adapter", None,"images/ifm_moneo_img.jpg"],
-            2016: ["Keyence FD-H20 Flow Meter", "f", "images/key_flow_img.jpg"]
-        }
-        try:
-            payload = {"code":"request","cid":-1,
-                       "adr":f"/iolinkmaster/port[{portNum}]/iolinkdevice/deviceid/getdata"}
-            portrequest = requests.post(url, json=payload, verify=False)
-            portrequest.raise_for_status()
-            json_data = portrequest.json()
-            id_val = json_data.get("data", {}).get("value")
-            return deviceIDs.get(id_val)
-        except Exception as e:
-            print(f"Port {portNum} detection failed: {e}")
-            return None
-
     MAX_IMAGE_SIZE = 135
 
     # ------------------- Port Frame Builder -------------------
+    port_widgets = {}   # portNum -> (picture canvas, description label)
+    photos = {}         # image file -> PhotoImage, shared by every port showing the same device
+
     def createPortFrame(parent, title):
         frame = ttk.Frame(parent, padding=10, relief="ridge")
         frame.grid_propagate(False)
@@ -234,32 +931,38 @@ def combinedWindow():
         picture = tk.Canvas(frame, bg="white", width=MAX_IMAGE_SIZE, height=MAX_IMAGE_SIZE)
         picture.grid(row=1, column=0, sticky="n", pady=5)
 
-        desc = ttk.Label(frame, text=None, font=("Arial", 10), anchor="center", justify="center", wraplength=150)
+        desc = ttk.Label(frame, text="Detecting...", font=("Arial", 10), anchor="center", justify="center", wraplength=150)
         desc.grid(row=2, column=0, sticky="n", pady=5)
 
         frame.rowconfigure(1, weight=1)
         frame.columnconfigure(0, weight=1)
 
-        portNum = int(title[-1:])
-        device = findDevice(portNum)
-        img_file = device[2] if device else "images/empty.jpg"
+        port_widgets[int(title[-1:])] = (picture, desc)
+        return frame
 
-        def resize_image(event=None):
-            try:
-                img = Image.open(resource_path(img_file))
-                img = img.resize((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
-                photo = ImageTk.PhotoImage(img)
-                picture.image = photo
-                picture.delete("all")
-                picture.create_image(0, 0, anchor="nw", image=photo)
-            except Exception as e:
-                print(f"Error loading image: {e}")
-
-        picture.bind("<Configure>", resize_image)
+    def showDevice(portNum, device): # fill in a port frame once its device id is known
+        picture, desc = port_widgets[portNum]
+        img_file = device[2] if device else "images/empty.jpg"
+        try:
+            if img_file not in photos:
+                photos[img_file] = ImageTk.PhotoImage(device_image(img_file, MAX_IMAGE_SIZE))
+            picture.image = photos[img_file]
+            picture.delete("all")
+            picture.create_image(0, 0, anchor="nw", image=photos[img_file])
+        except Exception as e:
+            print(f"Error loading image: {e}")
         desc.config(text=device[0] if device else "None")
-
         globals()[f"port{portNum}"] = device
-        return frame
+
+    pending = {n: identify_port(n) for n in (1, 2, 3, 4)} # all four ports in flight while the window is built
+
+    def checkDetection(): # Tk is not thread safe, so the main loop polls the futures
+        for n, future in list(pending.items()):
+            if future.done():
+                showDevice(n, future.result())
+                del pending[n]
+        if pending:
+            root.after(50, checkDetection)
 
     # ------------------- Main Window -------------------
     root = tk.Tk()
@@ -387,6 +1090,11 @@ def combinedWindow():
         results['flow_max'] = flow_max.get() if flow_max.get() != placeholder else None
         results['filename'] = filename.get()
         results['interval'] = interval_var.get()
+        for n, future in pending.items(): # submitted before every port answered, wait for the rest
+            try:
+                globals()[f"port{n}"] = future.result(timeout=IDENTIFY_TIMEOUT*2)
+            except concurrent.futures.TimeoutError:
+                globals()[f"port{n}"] = None
         root.destroy()
 
     buttonStyle = ttk.Style()
@@ -418,24 +1126,85 @@ def combinedWindow():
         pf = createPortFrame(rightFrame, t)
         pf.grid(row=r, column=c, padx=10, pady=10, sticky="nsew", )  # tight 2x2 grid
 
+    root.after(0, checkDetection)
     root.mainloop()
     return results
         
 
-# ---------- Plotting ----------
-def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting, and saving the recorded data
-    global running
-    global current_interval
-    global selected_interval
-    global burst_mode
+# ---------- Acquisition ----------
+class SampleRing: # fixed-size preallocated ring buffer, written by the sampler thread and read by the GUI without locks
+    def __init__(self, n_channels, size=RING_SIZE):
+        self.size = size
+        self.wall = np.zeros(size)                      # time.time() of each sample, for the excel time stamp
+        self.elapsed = np.zeros(size)                   # seconds since the first sample, on the scheduler's intended grid
+        self.delay = np.zeros(size)                     # ms the sample was taken after its intended time
+        self.values = np.full((size, n_channels), np.nan)
+        self.written = 0                                # total samples pushed, only the writer changes it
+        self.consumed = 0                               # samples handed to the reader, only the reader changes it
+
+    def push(self, wall, elapsed, values, delay=0.0): # single writer: fill the slot first, then publish it by bumping written
+        i = self.written % self.size
+        self.wall[i] = wall
+        self.elapsed[i] = elapsed
+        self.delay[i] = delay
+        self.values[i] = values
+        self.written += 1
+
+    def read_since(self, cursor): # everything pushed after cursor, returns (new_cursor, wall, elapsed, delay, values, dropped)
+        end = self.written
+        start = max(cursor, end - self.size)            # samples older than one lap were overwritten
+        idx = np.arange(start, end) % self.size
+        self.consumed = end
+        return end, self.wall[idx], self.elapsed[idx], self.delay[idx], self.values[idx], start - cursor
+
+
+def build_channels(ports, p_unit_index, f_unit_index, p_unit, f_unit): # one channel per port with a decodable device, pressure first then flow
+    channels = []
+    for i, port in enumerate(ports):
+        if port != None and port[1] != None and port[3] != None:
+            pressure = port[1] == "p"
+            channels.append({"port": i+1, "device": port[0], "kind": port[1], "decoder": port[3],
+                             "unit_index": p_unit_index if pressure else f_unit_index,
+                             "unit": p_unit if pressure else f_unit})
+    channels.sort(key=lambda c: (c["kind"] != "p", c["port"]))
+    for c in channels: # column names only carry the port when there is more than one sensor of a kind
+        base = "Pressure" if c["kind"] == "p" else "Flow Rate"
+        shared = sum(1 for other in channels if other["kind"] == c["kind"]) > 1
+        c["label"] = (f"Port {c['port']} " if shared else "") + f"{base} ({c['unit']})"
+    return channels
+
+
+def read_sample(channels, stats=None): # one read of every channel's port, returns the decoded value of each channel (nan if missing)
+    with perf.time("network"):
+        raw_values = read_ports([c["port"] for c in channels])
+    return decode_sample(channels, raw_values, stats)
+
+
+def decode_sample(channels, raw_values, stats=None): # {portNum: raw_hex} from a read or a push -> decoded value of each channel (nan if missing or malformed)
+    with perf.time("decode"):
+        values = []
+        malformed = False
+        for c in channels:
+            raw_hex = raw_values.get(c["port"])
+            try:
+                values.append(c["decoder"](raw_hex)[c["unit_index"]] if raw_hex else np.nan)
+            except (ValueError, TypeError, IndexError): # a short or garbled payload is a gap, not the end of the test
+                values.append(np.nan)
+                malformed = True
+        if malformed and stats is not None:
+            stats["errors"] += 1
+    return values
 
-    plt.ion()
-    settings = combinedWindow()
-    if len(settings) == 0:
-        messagebox.showwarning("No Filename","Please retry and submit a filename.")
-        return
-    p_unit = settings.get('pressure_unit')
-    f_unit = settings.get('flow_unit')
+
+def sensor_id(channel, channels): # device name for the sensor id rows, prefixed with the port when a kind has several
+    if sum(1 for c in channels if c["kind"] == channel["kind"]) > 1:
+        return f"Port {channel['port']}: {channel['device']}"
+    return channel["device"]
+
+
+def parse_settings(settings): # the combinedWindow / config file settings as typed values, with the gui's defaults
+    p_unit = settings.get('pressure_unit') or "psi"
+    f_unit = settings.get('flow_unit') or "l/m"
     if(settings.get('graph_format') == "Show latest points"):
         sliding = True
     else:
@@ -489,13 +1258,1130 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
             f_max = 0
     
     try:
-        selected_interval = float(settings.get('interval',1.0))
-        current_interval = selected_interval
-    except ValueError:
-        selected_interval = 1.0
-        current_interval = selected_interval
+        interval = float(settings.get('interval',1.0))
+    except (TypeError, ValueError):
+        interval = 1.0
+
+    if replay_source is not None: # the replay paces itself, from the recorded time stamps or as fast as possible
+        interval = 0.0
 
     filename = str(settings.get('filename'))
+    return {"p_unit": p_unit, "f_unit": f_unit, "p_unit_index": p_unit_index, "f_unit_index": f_unit_index,
+            "p_min": p_min, "p_max": p_max, "f_min": f_min, "f_max": f_max,
+            "sliding": sliding, "interval": interval, "filename": filename}
+
+
+def recording_meta(filename, starttime, channels): # test name, start and sensor id rows above the recorded data
+    pressureIDheader = ["Pressure Sensor ID"] + [sensor_id(c, channels) for c in channels if c["kind"] == "p"]
+    flowIDheader = ["Flow Meter ID"] + [sensor_id(c, channels) for c in channels if c["kind"] == "f"]
+    if len(pressureIDheader) == 1:
+        pressureIDheader.append("None")
+    if len(flowIDheader) == 1:
+        flowIDheader.append("None")
+    return [["Test Name", filename], ["Test Start", starttime], pressureIDheader, flowIDheader]
+
+
+def recording_header(channels):
+    return ["Time Stamp", "Elapsed Time (s)"] + [c["label"] for c in channels] + ["Sample Delay (ms)"] # delay last so the sensor columns keep their places
+
+
+class TickScheduler: # sample ticks on an absolute monotonic grid, tick k is due at origin + k*interval so timing error never accumulates
+    def __init__(self, interval, origin=None):
+        self.interval = interval
+        self.origin = time.monotonic() if origin is None else origin
+        self.tick = 0                       # next tick to fire on the current grid
+        self.last_intended = None           # intended time of the last tick fired
+        self.fired = 0
+        self.missed = 0                     # ticks skipped because a read overran them
+        self.delays = collections.deque(maxlen=JITTER_WINDOW) # seconds each tick fired after its intended time
+        self.lock = threading.Lock()        # the GUI changes the rate while the sampler thread waits on it
+
+    def due(self):
+        return self.origin + self.tick*self.interval
+
+    def set_interval(self, interval, immediate=False): # switch rate; immediate fires now, otherwise the grid continues from the last tick
+        with self.lock:
+            now = time.monotonic()
+            self.interval = interval
+            if immediate or self.last_intended is None:
+                self.origin, self.tick = now, 0
+            else:
+                self.origin, self.tick = self.last_intended, 1
+
+    def resume(self): # after a pause start a fresh grid now, the paused ticks are not missed deadlines
+        with self.lock:
+            if self.due() < time.monotonic():
+                self.origin, self.tick = time.monotonic(), 0
+
+    def wait(self, stop_event): # block until the next tick, returns its (intended, actual) monotonic time or None once stop_event is set
+        while True:
+            with self.lock:
+                intended = self.due()
+            remaining = intended - time.monotonic()
+            if remaining <= 0:
+                break
+            if remaining > SPIN_MARGIN: # sleep most of the way, re-reading the grid in case the rate changed
+                if stop_event.wait(min(remaining - SPIN_MARGIN, 0.05)):
+                    return None
+            else:
+                time.sleep(0)
+        actual = time.monotonic()
+        with self.lock:
+            if self.due() != intended: # rate changed at the last moment, fire on the new grid
+                intended = min(self.due(), actual)
+            if self.interval <= 0: # no grid, every tick is due the moment it fires
+                intended = actual
+            self.tick += 1
+            self.last_intended = intended
+            self.fired += 1
+            self.delays.append(actual - intended)
+        return intended, actual
+
+    def skip_overrun(self): # after a slow read skip every tick that already passed instead of bursting to catch up, returns ticks skipped
+        with self.lock:
+            late = time.monotonic() - self.due()
+            if late < 0 or self.interval <= 0:
+                return 0
+            skipped = int(late // self.interval) + 1
+            self.tick += skipped
+            self.missed += skipped
+            return skipped
+
+    def jitter_stats(self): # delay of the latest ticks behind their intended time, in ms
+        delays = np.asarray(self.delays) * 1000
+        stats = {"interval": self.interval, "ticks": self.fired, "missed": self.missed}
+        if len(delays):
+            stats.update({"mean_ms": float(delays.mean()), "std_ms": float(delays.std()),
+                          "p50_ms": float(np.percentile(delays, 50)), "p99_ms": float(np.percentile(delays, 99)),
+                          "max_ms": float(delays.max())})
+        return stats
+
+
+def sampler_loop(ring, channels, stop_event, stats, scheduler=None, push=None): # background thread: sample on the scheduler's ticks (or the master's pushes) and push into ring
+    try:
+        _sampler_loop(ring, channels, stop_event, stats, scheduler or TickScheduler(current_interval), push)
+    except Exception as e: # anything unexpected ends sampling, the gui / headless loop sees stats["error"] and stops the test
+        stats["error"] = f"Sampling stopped: {e!r}"
+        print(stats["error"])
+
+
+def _sampler_loop(ring, channels, stop_event, stats, scheduler, push):
+    first_intended = None
+    last_sample = None                      # monotonic time of the newest sample, polled or pushed
+    was_running = False
+    while not stop_event.is_set():
+        if not running:
+            was_running = False
+            if push is not None:
+                push.clear() # nothing is recorded while stopped
+            stop_event.wait(0.01)
+            continue
+        if not was_running: # resuming after stop should not count the pause as missed deadlines
+            scheduler.resume()
+            was_running = True
+
+        if push is not None:
+            if not push.active and push.pending(): # pushes are arriving again
+                push.active = True
+                print("Push subscription resumed, polling stopped")
+            if push.active:
+                deadline = time.monotonic() + push.lapse_timeout()
+                received = None
+                while received is None and running and not stop_event.is_set() and time.monotonic() < deadline:
+                    received = push.next(0.05)
+                if received is None:
+                    if time.monotonic() < deadline: # stopped or paused while waiting
+                        continue
+                    push.active = False
+                    stats["push_lapses"] = stats.get("push_lapses", 0) + 1
+                    print("Push subscription lapsed, polling until it resumes")
+                    scheduler.resume()
+                    continue
+                arrival, raw_values = received
+                if last_sample is not None and arrival <= last_sample: # queued before the last poll when switching back
+                    continue
+                last_sample = arrival
+                values = decode_sample(channels, raw_values, stats)
+                if first_intended is None:
+                    first_intended = arrival
+                    stats["started"] = arrival
+                wall = time.time() - (time.monotonic() - arrival)
+                ring.push(wall, round(arrival - first_intended, 3), values, 0.0) # the master's timer sets the pace
+                continue
+
+        if scheduler.interval <= 0: # replaying, wait for the GUI rather than overwrite unsaved samples
+            while ring.written - ring.consumed >= ring.size and not stop_event.is_set():
+                stop_event.wait(0.001)
+        fired = scheduler.wait(stop_event)
+        if fired is None:
+            break
+        intended, actual = fired
+        wall = time.time() - (actual - intended) # wall clock of the intended tick
+        try:
+            values = read_sample(channels, stats)
+        except ReplayFinished:
+            stats["finished"] = True
+            return
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred: {e}")
+            stats["errors"] += 1
+            scheduler.skip_overrun()
+            stats["missed"] = scheduler.missed
+            continue
+
+        if first_intended is None:
+            first_intended = intended
+            stats["started"] = intended
+        last_sample = intended
+        scheduler.skip_overrun()
+        stats["missed"] = scheduler.missed
+        ring.push(wall, round(intended - first_intended, 3), values, round((actual - intended)*1000, 3))
+
+TRIGGER_KINDS = {"rate": 1, "rise": 1, "fall": 1, "cross": 1, "band": 2} # trigger type -> number of values after the channel
+
+def parse_trigger(text): # "kind:channel:value[:value]", channel is pressure, flow or a port number
+    parts = text.split(":")
+    if len(parts) < 3 or parts[0] not in TRIGGER_KINDS or len(parts) != 2 + TRIGGER_KINDS[parts[0]]:
+        raise ValueError(f"bad trigger {text!r}, use rate:CH:PER_S, rise:CH:X, fall:CH:X, cross:CH:X or band:CH:LOW:HIGH "
+                         "with CH = pressure, flow or a port number")
+    if parts[1] not in ("pressure", "flow") and not parts[1].isdigit():
+        raise ValueError(f"bad trigger channel {parts[1]!r}, use pressure, flow or a port number")
+    return {"kind": parts[0], "channel": parts[1], "values": [float(v) for v in parts[2:]], "text": text}
+
+
+class TriggerBurst: # adaptive burst: sample at the burst rate, keep only the base-interval samples until a trigger fires
+    def __init__(self, triggers, channels, base_interval, pre=PRE_TRIGGER, post=POST_TRIGGER):
+        self.triggers = []
+        for trigger in triggers: # resolve each trigger to the channel indexes it watches
+            target = trigger["channel"]
+            idx = [i for i, c in enumerate(channels)
+                   if (target == "pressure" and c["kind"] == "p") or (target == "flow" and c["kind"] == "f")
+                   or (target.isdigit() and c["port"] == int(target))]
+            if not idx:
+                print(f"Trigger {trigger['text']} matches no connected sensor, ignored")
+                continue
+            self.triggers.append(dict(trigger, idx=idx))
+        self.base_interval = base_interval
+        self.pre = pre
+        self.post = post
+        self.pending = collections.deque()  # pre-trigger samples not recorded yet
+        self.burst_until = -np.inf          # elapsed time the current burst lasts to
+        self.next_base = -np.inf            # elapsed time of the next base-interval sample
+        self.last_kept = -np.inf
+        self.last_seen = -np.inf
+        self.previous = None                # (elapsed, values) of the sample before, for rates and crossings
+        self.manual = False                 # the burst button keeps every sample
+        self.events = []                    # (elapsed, trigger text) of each burst start
+
+    @property
+    def bursting(self):
+        return self.manual or self.last_seen <= self.burst_until
+
+    def fired(self, et, v): # text of the first trigger that fires on this sample, or None
+        for trigger in self.triggers:
+            low = trigger["values"][0]
+            for i in trigger["idx"]:
+                if np.isnan(v[i]):
+                    continue
+                kind = trigger["kind"]
+                if kind == "band":
+                    if not low <= v[i] <= trigger["values"][1]:
+                        return trigger["text"]
+                    continue
+                if self.previous is None or np.isnan(self.previous[1][i]):
+                    continue
+                before = self.previous[1][i]
+                if kind == "rate":
+                    dt = et - self.previous[0]
+                    if dt > 0 and abs(v[i] - before)/dt > low:
+                        return trigger["text"]
+                elif (kind in ("rise", "cross") and before < low <= v[i]) or (kind in ("fall", "cross") and before > low >= v[i]):
+                    return trigger["text"]
+        return None
+
+    def process(self, walls, ets, delays, values): # the samples to record out of one block read from the ring
+        kept = []
+        for row in zip(walls, ets, delays, values):
+            et, v = row[1], row[3]
+            fired = self.fired(et, v)
+            self.previous = (et, v)
+            self.last_seen = et
+            if fired:
+                if et > self.burst_until: # a new burst: record the pre-trigger seconds first
+                    self.events.append((float(et), fired))
+                    print(f"Trigger {fired} fired at {et:.2f}s, recording at the burst rate")
+                    kept += [r for r in self.pending if r[1] > self.last_kept and r[1] >= et - self.pre]
+                    self.pending.clear()
+                self.burst_until = et + self.post
+            if self.manual or et <= self.burst_until or et >= self.next_base - 1e-9:
+                kept.append(row)
+                self.last_kept = et
+                self.next_base = et + self.base_interval # after a burst the base interval restarts from its last sample
+            else:
+                self.pending.append(row)
+                while self.pending and self.pending[0][1] < et - self.pre:
+                    self.pending.popleft()
+        if not kept:
+            return walls[:0], ets[:0], delays[:0], values[:0]
+        return (np.array([r[0] for r in kept]), np.array([r[1] for r in kept]),
+                np.array([r[2] for r in kept]), np.array([r[3] for r in kept]))
+
+
+def start_adaptive(channels, base_interval, triggers=None): # TriggerBurst when triggers are set and the base rate is slower than burst
+    triggers = ADAPTIVE_TRIGGERS if triggers is None else triggers
+    if not triggers or replay_source is not None or base_interval <= BURST_INTERVAL:
+        return None
+    adaptive = TriggerBurst(triggers, channels, base_interval, PRE_TRIGGER, POST_TRIGGER)
+    if not adaptive.triggers:
+        return None
+    print(f"Adaptive burst: sampling every {BURST_INTERVAL}s, keeping every {base_interval}s until "
+          f"{', '.join(t['text'] for t in adaptive.triggers)} fires ({adaptive.pre}s before, {adaptive.post}s after)")
+    return adaptive
+
+# ---------- Push Subscription ----------
+def local_address_for(host): # address of the interface that routes to host, for the callback url the master posts to
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.connect((host, 9)) # udp connect sends nothing, it only picks the route
+        return sock.getsockname()[0]
+
+
+class PushHandler(BaseHTTPRequestHandler): # receives the master's datachanged events
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if self.client_address[0] != self.server.source.master_ip: # only the subscribed master may post samples
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            self.server.source.deliver(json.loads(self.rfile.read(length)))
+            self.send_response(200)
+        except ValueError:
+            self.send_response(400)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args): # one line per push would flood the console
+        pass
+
+
+class PushSource: # IFM timer[1] datachanged subscription: the master posts every port's pdin to a local listener on each timer tick
+    def __init__(self, ports, interval, listen_port=PUSH_LISTEN_PORT, lease=PUSH_LEASE, base_url=None):
+        self.ports = list(ports)
+        self.interval = interval
+        self.listen_port = listen_port
+        self.lease = lease
+        self.base_url = base_url
+        self.queue = queue.Queue(maxsize=RING_SIZE)
+        self.active = False                 # the sampler is taking samples from pushes rather than polling
+        self.pushes = 0
+        self.callback = None
+        self.server = None
+        self.master_ip = None               # pushes from any other address are refused
+        self.subscribed_at = None
+        self.stop_event = threading.Event()
+
+    def start(self): # listen, then subscribe; raises if the master refuses so the caller can stay on polling
+        host = split_host(self.base_url or url)[0]
+        self.master_ip = socket.gethostbyname(host)
+        local_ip = local_address_for(self.master_ip) # listen only on the interface facing the master
+        self.server = ThreadingHTTPServer((local_ip, self.listen_port), PushHandler)
+        self.server.daemon_threads = True
+        self.server.source = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.callback = f"http://{local_ip}:{self.server.server_address[1]}/flowpro"
+        try:
+            self.subscribe()
+        except Exception:
+            self.server.shutdown()
+            self.server.server_close()
+            raise
+        self.active = True
+        threading.Thread(target=self.keep_alive, daemon=True).start()
+        print(f"Subscribed to pdin pushes every {self.interval}s at {self.callback}")
+
+    def subscribe(self): # set the timer and (re)register the callback, the same call renews the lease
+        self.set_interval(self.interval)
+        payload = {"code": "request", "cid": -1, "adr": "/timer[1]/counter/datachanged/subscribe",
+                   "data": {"callback": self.callback, "duration": self.lease,
+                            "datatosend": [f"/iolinkmaster/port[{n}]/iolinkdevice/pdin" for n in self.ports]}}
+        resp_json = master_post(payload, base_url=self.base_url)
+        if resp_json.get("code") != 200:
+            raise requests.exceptions.RequestException(f"Subscribe failed with code {resp_json.get('code')}")
+        self.subscribed_at = time.monotonic()
+
+    def set_interval(self, interval): # master timer period, in whole ms
+        self.interval = interval
+        resp_json = master_post({"code": "request", "cid": -1, "adr": "/timer[1]/interval/setdata",
+                                 "data": {"newvalue": max(1, int(round(interval*1000)))}}, base_url=self.base_url)
+        if resp_json.get("code") != 200:
+            raise requests.exceptions.RequestException(f"Timer interval rejected with code {resp_json.get('code')}")
+
+    def change_interval(self, interval): # set_interval on a worker thread for the gui, a failure is reported instead of lost in the future
+        def report(future):
+            if future.exception() is not None:
+                print(f"Push interval change to {interval}s failed ({future.exception()}), retried on the next resubscribe")
+        future = port_pool().submit(self.set_interval, interval)
+        future.add_done_callback(report)
+        return future
+
+    def keep_alive(self): # renew the lease at half-time, and keep resubscribing while the sampler has fallen back to polling
+        while not self.stop_event.wait(1.0):
+            due = self.lease/2 if self.active else PUSH_RETRY
+            if time.monotonic() - self.subscribed_at < due:
+                continue
+            try:
+                self.subscribe()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Push resubscribe failed: {e}")
+                self.subscribed_at = time.monotonic()
+
+    def deliver(self, event): # one datachanged event -> queue of (arrival, {portNum: raw_hex}), ValueError if the event is malformed
+        data = event.get("data") if isinstance(event, dict) else None
+        payload = data.get("payload") if isinstance(data, dict) else None
+        if not isinstance(payload, dict):
+            raise ValueError("push event has no data.payload object")
+        values = {}
+        for adr, entry in payload.items():
+            if not isinstance(entry, dict):
+                raise ValueError(f"push entry {adr!r} is not an object")
+            if adr.endswith("/pdin") and entry.get("code") == 200:
+                _, bracket, rest = adr.partition("port[")
+                port, closed, _ = rest.partition("]")
+                if not (bracket and closed and port.isdigit()) or not isinstance(entry.get("data"), str):
+                    raise ValueError(f"malformed push entry {adr!r}")
+                values[int(port)] = entry["data"]
+        if not values:
+            return
+        self.pushes += 1
+        item = (time.monotonic(), values)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full: # the sampler is not keeping up, keep the newest
+            with suppress(queue.Empty):
+                self.queue.get_nowait()
+            self.queue.put_nowait(item)
+
+    def next(self, timeout): # (arrival, raw values) of the next push, or None if nothing came in time
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def pending(self):
+        return not self.queue.empty()
+
+    def clear(self):
+        with suppress(queue.Empty):
+            while True:
+                self.queue.get_nowait()
+
+    def lapse_timeout(self):
+        return max(PUSH_LAPSE*self.interval, 1.0)
+
+    def stop(self):
+        self.stop_event.set()
+        with suppress(Exception):
+            master_post({"code": "request", "cid": -1, "adr": "/timer[1]/counter/datachanged/unsubscribe",
+                         "data": {"callback": self.callback}}, base_url=self.base_url)
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def start_push(channels, interval): # PushSource for the channels' ports when --push is on, None to keep polling
+    if not PUSH_MODE or replay_source is not None or interval <= 0:
+        return None
+    push = PushSource(sorted({c["port"] for c in channels}), interval, listen_port=PUSH_LISTEN_PORT)
+    try:
+        push.start()
+    except (OSError, ValueError, requests.exceptions.RequestException) as e:
+        print(f"Push subscription unavailable ({e}), polling instead")
+        return None
+    return push
+
+# ---------- Async Acquisition ----------
+def split_host(address): # "10.0.0.2" or "10.0.0.2:8080" -> (host, port)
+    address = address.replace("http://", "").rstrip("/")
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return address, MASTER_HTTP_PORT
+
+
+class MasterHTTPError(ConnectionError): # the master answered with an http error status
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class AsyncMasterClient: # keep-alive http connection to one master on asyncio streams, plus its polling state
+    def __init__(self, address, ports=None):
+        self.address = address
+        self.host, self.port = split_host(address)
+        self.ports = list(ports) if ports else [1, 2, 3, 4]
+        self.devices = {}                   # port -> deviceIDs entry, only the identified ports are polled
+        self.identified = set()             # ports whose deviceid read answered, with or without a decodable device
+        self.identify_failures = 0
+        self.identify_at = 0.0              # loop time before which the unidentified ports are not asked again (back-off)
+        self.reader = None
+        self.writer = None
+        self.multi_supported = True
+        self.failures = 0
+        self.retry_at = 0.0                 # loop time before which the master is skipped (back-off)
+
+    def unidentified(self): # configured ports still waiting for a deviceid answer
+        return [n for n in self.ports if n not in self.identified]
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            with suppress(Exception):
+                await self.writer.wait_closed()
+        self.reader = None
+        self.writer = None
+
+    async def post(self, payload): # send one JSON request over the kept-alive connection
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode()
+        self.writer.write((f"POST / HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\nConnection: keep-alive\r\n\r\n").encode() + body)
+        await self.writer.drain()
+        status = await self.reader.readline()
+        if not status:
+            raise ConnectionError("master closed the connection")
+        parts = status.split()
+        if len(parts) < 2 or not parts[1].isdigit(): # truncated or garbled, back off like any other connection failure
+            raise ConnectionError(f"malformed status line {status[:60]!r}")
+        code = int(parts[1])
+        length = 0
+        keep_alive = True
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+            elif name.strip().lower() == "connection" and value.strip().lower() == "close":
+                keep_alive = False
+        reply = await self.reader.readexactly(length)
+        if not keep_alive:
+            await self.close()
+        if code >= 400:
+            raise MasterHTTPError(code)
+        return json.loads(reply)
+
+    async def read_ports(self): # pdin of every identified port, one /getdatamulti round-trip when supported (same fallback rules as read_ports)
+        if self.multi_supported:
+            adrs = {f"/iolinkmaster/port[{n}]/iolinkdevice/pdin": n for n in self.devices}
+            try:
+                resp_json = await self.post({"code": "request", "cid": -1, "adr": "/getdatamulti", "data": {"datatosend": list(adrs)}})
+            except MasterHTTPError as e:
+                resp_json = {"code": e.status}
+            if resp_json.get("code") == 200:
+                values = {}
+                for adr, n in adrs.items():
+                    entry = resp_json.get("data", {}).get(adr, {})
+                    values[n] = entry.get("data") if entry.get("code") == 200 else None
+                return values
+            if resp_json.get("code") in MULTI_UNSUPPORTED_CODES:
+                self.multi_supported = False
+        values = {}
+        for n in self.devices: # a single connection carries one request at a time
+            resp_json = await self.post(PORT_PAYLOADS[n])
+            values[n] = resp_json.get("data", {}).get("value")
+        return values
+
+
+class AsyncAcquisition: # poll many masters concurrently and emit one time-aligned sample stream
+    def __init__(self, masters, interval=1.0, timeout=None, max_backoff=MAX_BACKOFF):
+        # masters: list of addresses, or (address, [ports]) pairs
+        self.masters = [AsyncMasterClient(*m) if isinstance(m, (tuple, list)) else AsyncMasterClient(m) for m in masters]
+        self.interval = interval
+        self.timeout = timeout or min(HTTP_TIMEOUT, interval)
+        self.max_backoff = max_backoff
+        self.missed = 0
+        self.errors = 0
+
+    async def identify_master(self, master): # read the deviceid of every port not identified yet, keeps the ports we can decode
+        ports = master.unidentified()
+        answers = await asyncio.gather(*(asyncio.to_thread(read_device, n, "http://"+master.address, self.timeout) for n in ports))
+        found = {}
+        for n, (answered, device) in zip(ports, answers):
+            if answered: # an empty or unknown port is settled too, only failed reads are asked again
+                master.identified.add(n)
+            if device and device[3]:
+                found[n] = device
+        master.devices = dict(sorted({**master.devices, **found}.items()))
+        return found
+
+    async def identify(self): # identify every master, ports whose deviceid read failed are retried by _poll
+        await asyncio.gather(*(self.identify_master(m) for m in self.masters))
+        for master in self.masters:
+            if master.unidentified():
+                print(f"Master {master.address} ports {master.unidentified()} did not answer, retrying with back-off")
+        return {(m.address, n): device[0] for m in self.masters for n, device in m.devices.items()}
+
+    async def _poll(self, master, now): # one master's decoded ports, or None while it is failing / backing off
+        if now < master.retry_at:
+            return None
+        try:
+            if master.unidentified() and now >= master.identify_at: # ports whose deviceid read failed, retried on their own back-off
+                found = await self.identify_master(master)
+                if found:
+                    print(f"Master {master.address} identified: " + ", ".join(f"port {n} {d[0]}" for n, d in found.items()))
+                if master.unidentified():
+                    master.identify_failures += 1
+                    master.identify_at = now + min(self.interval * 2**master.identify_failures, self.max_backoff)
+                else:
+                    master.identify_failures = 0
+            if not master.devices: # unreachable or empty so far, the whole master backs off
+                raise ConnectionError("no decodable devices")
+            raw_values = await asyncio.wait_for(master.read_ports(), self.timeout)
+            master.failures = 0
+            return {n: master.devices[n][3](raw_hex) for n, raw_hex in raw_values.items() if raw_hex}
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            await master.close() # a half-read reply would corrupt the next one
+            master.failures += 1
+            master.retry_at = now + min(self.interval * 2**master.failures, self.max_backoff)
+            self.errors += 1
+            print(f"Master {master.address} failed ({e!r}), retrying in {master.retry_at-now:.1f}s")
+            return None
+
+    async def stream(self, duration=None, count=None): # async generator of {"time", "elapsed", "values": {(address, port): [units...] or None}}, a late master's ports join once identified
+        if not any(m.devices for m in self.masters):
+            await self.identify()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        tick = 0
+        try:
+            while (count is None or tick < count) and (duration is None or tick*self.interval < duration):
+                deadline = start + tick*self.interval # absolute grid, no drift
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+                wall = time.time()
+                results = await asyncio.gather(*(self._poll(m, deadline) for m in self.masters))
+                values = {}
+                for master, decoded in zip(self.masters, results):
+                    for n in master.devices:
+                        values[(master.address, n)] = decoded.get(n) if decoded else None
+                yield {"time": wall, "elapsed": round(deadline - start, 3), "values": values}
+
+                tick += 1
+                behind = int((loop.time() - start) / self.interval) - tick
+                if behind > 0: # the poll overran later ticks, skip them
+                    self.missed += behind
+                    tick += behind
+        finally:
+            await asyncio.gather(*(m.close() for m in self.masters))
+
+
+def run_async_acquisition(masters, interval=1.0, on_sample=print, duration=None, count=None): # blocking helper around AsyncAcquisition.stream
+    acquisition = AsyncAcquisition(masters, interval)
+
+    async def consume():
+        async for sample in acquisition.stream(duration, count):
+            on_sample(sample)
+
+    with suppress(KeyboardInterrupt): # Ctrl+C ends the stream, stream() closes the masters
+        asyncio.run(consume())
+    return acquisition
+
+
+def parse_master_spec(spec): # "10.0.0.2" or "10.0.0.2:8080/1,3" -> address, or (address, [ports])
+    address, sep, ports = spec.partition("/")
+    if not sep:
+        return address
+    return address, [int(n) for n in ports.split(",") if n]
+
+
+def run_multi_master(masters, interval, output=None, duration=None, count=None): # --masters: poll every master with AsyncAcquisition, one json line per time-aligned sample
+    out = open(output, "a") if output else sys.stdout
+    written = [0]
+
+    def on_sample(sample):
+        values = {f"{address}/{n}": value for (address, n), value in sample["values"].items()}
+        out.write(json.dumps({"time": sample["time"], "elapsed": sample["elapsed"], "values": values}, default=float) + "\n")
+        out.flush()
+        written[0] += 1
+
+    try:
+        acquisition = run_async_acquisition([parse_master_spec(m) for m in masters], interval, on_sample, duration, count)
+    finally:
+        if output:
+            out.close()
+    print(f"{written[0]} samples from {len(masters)} masters, {acquisition.missed} missed ticks, {acquisition.errors} errors",
+          file=sys.stderr)
+    return acquisition
+
+# ---------- Recording ----------
+class StreamRecorder: # append-only csv written as samples arrive, turned into the .xlsx layout in one pass at the end
+    def __init__(self, file_path, meta_rows, header, fsync_interval=FSYNC_INTERVAL):
+        self.file_path = file_path
+        self.csv_path = os.path.splitext(file_path)[0] + ".csv"
+        self.meta_rows = meta_rows          # [["Test Name", name], ["Test Start", datetime], ...] above the data
+        self.header = header
+        self.fsync_interval = fsync_interval
+        self.rows = 0
+        self.file = open(self.csv_path, "w", newline="", buffering=1024*64)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+        self.last_sync = time.monotonic()
+
+    def write_rows(self, rows): # rows of [time.time(), elapsed, values..., delay], constant cost per row no matter how long the test runs
+        self.writer.writerows([datetime.fromtimestamp(row[0]).isoformat()] + list(row[1:]) for row in rows)
+        self.rows += len(rows)
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self): # finish the csv and write the spreadsheet
+        if self.file.closed:
+            return
+        self.sync()
+        self.file.close()
+        export_xlsx(self.file_path, self.meta_rows, self.header, read_csv_rows(self.csv_path))
+        if not KEEP_CSV:
+            with suppress(OSError):
+                os.remove(self.csv_path)
+
+
+def read_csv_rows(csv_path): # stream data rows back out of a recorder csv with their types restored
+    with open(csv_path, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            try:
+                stamp = datetime.fromisoformat(row[0])
+            except ValueError:
+                stamp = row[0]
+            yield [stamp] + [float(v) if v not in ("", "nan") else None for v in row[1:]]
+
+
+def export_xlsx(file_path, meta_rows, header, rows): # test name, start, sensor ids, blank, header at row 6, then data; write-only so memory stays flat
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    from openpyxl.utils import get_column_letter
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    widths = {}
+    for r in meta_rows + [header]:
+        for i, v in enumerate(r):
+            widths[i] = max(widths.get(i, 0), len(str(v)))
+    for i, width in widths.items():
+        ws.column_dimensions[get_column_letter(i+1)].width = width
+
+    thin = Side(style="thin")
+    def header_row(values):
+        cells = []
+        for v in values:
+            cell = WriteOnlyCell(ws, value=v)
+            cell.font = Font(bold=True)
+            cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+            cell.alignment = Alignment(horizontal='left', vertical='center')
+            cells.append(cell)
+        return cells
+
+    for r in meta_rows:
+        ws.append(header_row(r))
+    ws.append([])
+    ws.append(header_row(header))
+    for row in rows:
+        ws.append(row)
+    wb.save(file_path)
+
+class ColumnarRecorder: # append-only .fpr file of fixed-width float64 records, memory-mappable for replay and analysis
+    def __init__(self, file_path, meta_rows, header, fsync_interval=FSYNC_INTERVAL):
+        self.file_path = file_path
+        self.header = header
+        self.fsync_interval = fsync_interval
+        self.rows = 0
+        meta = {"columns": ["timestamp"] + list(header[1:]), "header": header,
+                "meta_rows": [[str(v) for v in r] for r in meta_rows]}
+        meta_bytes = json.dumps(meta).encode()
+        meta_bytes += b" " * (-(len(FPR_MAGIC) + 4 + len(meta_bytes)) % 8) # records start 8-byte aligned
+        self.file = open(file_path, "wb", buffering=1024*64)
+        self.file.write(FPR_MAGIC + len(meta_bytes).to_bytes(4, "little") + meta_bytes)
+        self.last_sync = time.monotonic()
+
+    def write_rows(self, rows): # rows of [time.time(), elapsed, values..., delay]
+        self.file.write(np.asarray(rows, dtype=float).tobytes())
+        self.rows += len(rows)
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.sync()
+        self.file.close()
+
+
+def open_recording(path): # (metadata, memmap) of a .fpr file, each column is a zero-copy view: data["Elapsed Time (s)"]
+    with open(path, "rb") as f:
+        if f.read(len(FPR_MAGIC)) != FPR_MAGIC:
+            raise ValueError(f"{path} is not a FlowPro recording")
+        meta_len = int.from_bytes(f.read(4), "little")
+        meta = json.loads(f.read(meta_len))
+    offset = len(FPR_MAGIC) + 4 + meta_len
+    dtype = np.dtype([(name, "<f8") for name in meta["columns"]])
+    count = (os.path.getsize(path) - offset) // dtype.itemsize # a torn final record from a crash is ignored
+    if count == 0:
+        return meta, np.zeros(0, dtype=dtype)
+    return meta, np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+def recording_to_xlsx(path, out_path=None, decimate=1): # produce the usual spreadsheet from a .fpr, keeping every decimate-th row
+    meta, data = open_recording(path)
+    out_path = out_path or os.path.splitext(path)[0] + ".xlsx"
+    columns = meta["columns"]
+
+    def rows():
+        for record in data[::max(1, int(decimate))]:
+            yield [datetime.fromtimestamp(record[0])] + [None if np.isnan(record[c]) else float(record[c]) for c in columns[1:]]
+
+    meta_rows = meta["meta_rows"]
+    for r in meta_rows:
+        if r[0] == "Test Start":
+            with suppress(ValueError):
+                r[1] = datetime.fromisoformat(r[1])
+    export_xlsx(out_path, meta_rows, meta["header"], rows())
+    print(f"Wrote {out_path}")
+    return out_path
+
+
+def open_recorder(file_path, meta_rows, header): # pick the recorder from the chosen file extension
+    if file_path.lower().endswith(".fpr"):
+        return ColumnarRecorder(file_path, meta_rows, header)
+    return StreamRecorder(file_path, meta_rows, header)
+
+# ---------- Live Streaming ----------
+class StreamClient: # one subscriber: a bounded queue of encoded samples plus its lag counters
+    def __init__(self, address, jsonl=False, queue_size=STREAM_QUEUE):
+        self.address = address
+        self.jsonl = jsonl                  # plain json lines instead of server-sent events
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent_seq = 0
+        self.delivery = 0.0                 # seconds between publishing and sending the last sample
+
+    def offer(self, item): # never blocks the publisher: a full queue drops its oldest sample
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with suppress(queue.Empty):
+                self.queue.get_nowait()
+                self.dropped += 1
+            with suppress(queue.Full):
+                self.queue.put_nowait(item)
+
+
+class StreamHandler(BaseHTTPRequestHandler): # GET /stream (server-sent events), /stream?format=jsonl, /clients (lag report)
+    def do_GET(self):
+        streamer = self.server.streamer
+        path, _, query = self.path.partition("?")
+        if path == "/clients":
+            body = json.dumps(streamer.lag_report()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path != "/stream":
+            self.send_error(404)
+            return
+        client = StreamClient(f"{self.client_address[0]}:{self.client_address[1]}", jsonl="format=jsonl" in query)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson" if client.jsonl else "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            self.send(client, "meta", streamer.meta_line)
+            streamer.add(client)
+            while not streamer.closed.is_set():
+                try:
+                    seq, published, line = client.queue.get(timeout=STREAM_KEEPALIVE)
+                except queue.Empty:
+                    if not client.jsonl:
+                        self.wfile.write(b": keep-alive\n\n")
+                        self.wfile.flush()
+                    continue
+                self.send(client, "sample", line)
+                client.sent_seq = seq
+                client.delivery = time.monotonic() - published
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            streamer.remove(client)
+
+    def send(self, client, event, line):
+        self.wfile.write(line + b"\n" if client.jsonl else b"event: " + event.encode() + b"\ndata: " + line + b"\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SampleStreamer: # publish every recorded sample to any number of local or lan subscribers without ever blocking acquisition
+    def __init__(self, channels, meta, host=STREAM_HOST, port=0):
+        self.labels = [c["label"] for c in channels]
+        self.meta_line = json.dumps(dict(meta, channels=[{"label": c["label"], "port": c["port"], "device": c["device"],
+                                                          "unit": c["unit"]} for c in channels]), default=str).encode()
+        self.host = host
+        self.port = port
+        self.clients = []
+        self.lock = threading.Lock()        # the client list changes on connection threads
+        self.seq = 0
+        self.closed = threading.Event()
+        self.server = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), StreamHandler)
+        self.server.daemon_threads = True
+        self.server.streamer = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Streaming live samples at http://{self.host}:{self.port}/stream (lag report at /clients)")
+        return self
+
+    def add(self, client):
+        with self.lock:
+            client.sent_seq = self.seq # a new subscriber starts at the newest sample, not behind everything published before it
+            self.clients = self.clients + [client]
+        print(f"Stream subscriber {client.address} connected")
+
+    def remove(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients = [c for c in self.clients if c is not client]
+                print(f"Stream subscriber {client.address} disconnected, {client.dropped} samples dropped")
+
+    def publish(self, walls, ets, delays, values): # encode each sample once and offer it to every subscriber
+        clients = self.clients              # replaced, never mutated, so no lock on the hot path
+        if not clients:
+            self.seq += len(ets)
+            return
+        published = time.monotonic()
+        for w, et, d, v in zip(walls, ets, delays, values):
+            self.seq += 1
+            line = json.dumps({"seq": self.seq, "time": w, "elapsed": et, "delay_ms": d,
+                               "values": dict(zip(self.labels, [None if np.isnan(x) else x for x in v.tolist()]))}).encode()
+            for client in clients:
+                client.offer((self.seq, published, line))
+
+    def lag_report(self): # per subscriber: samples waiting, samples behind the newest, samples dropped, last delivery delay
+        return [{"client": c.address, "queued": c.queue.qsize(), "behind": self.seq - c.sent_seq, "dropped": c.dropped,
+                 "delivery_ms": c.delivery*1000} for c in self.clients]
+
+    def lag_text(self): # one line for the periodic rate report
+        report = self.lag_report()
+        if not report:
+            return "no stream subscribers"
+        worst = max(report, key=lambda r: r["behind"])
+        return (f"{len(report)} stream subscribers, worst {worst['client']} {worst['behind']} behind, "
+                f"{sum(r['dropped'] for r in report)} dropped")
+
+    def stop(self):
+        self.closed.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def start_streamer(channels, meta): # SampleStreamer when --stream is on, None otherwise
+    if STREAM_PORT is None:
+        return None
+    try:
+        return SampleStreamer(channels, meta, STREAM_HOST, STREAM_PORT).start()
+    except OSError as e:
+        print(f"Live streaming unavailable ({e})")
+        return None
+
+# ---------- Plotting ----------
+class BlitRenderer: # redraw only the animated artists over a cached background, the full figure is drawn only when it changes
+    def __init__(self, fig, artists):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.artists = artists
+        self.background = None
+        for artist in artists:
+            artist.set_animated(True)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.savefig = fig.savefig
+        fig.savefig = self.save_with_artists # animated artists are skipped by savefig, so the toolbar save would lose the lines
+
+    def save_with_artists(self, *args, **kwargs):
+        for artist in self.artists:
+            artist.set_animated(False)
+        try:
+            return self.savefig(*args, **kwargs)
+        finally:
+            for artist in self.artists:
+                artist.set_animated(True)
+
+    def on_draw(self, event): # every full draw (resize, axis change, button text) refreshes the cached background
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_artists()
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self):
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+
+class SampleStore: # typed columns behind the plot: O(1) append, zero-copy latest-N window, running summary statistics
+    def __init__(self, n_channels, window=None, capacity=1024):
+        self.window = window                # keep only the latest window samples, None keeps everything
+        size = 2*window if window else capacity
+        self.x = np.empty(size)
+        self.y = np.empty((size, n_channels))
+        self.count = 0                      # samples ever appended
+        self.total = np.zeros(n_channels)
+        self.valid = np.zeros(n_channels, dtype=np.int64)
+        self.low = np.full(n_channels, np.inf)
+        self.high = np.full(n_channels, -np.inf)
+
+    def extend(self, xs, ys): # append a block of samples, xs (k,) and ys (k, n_channels)
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float).reshape(len(xs), -1)
+        if len(xs) == 0:
+            return
+        finite = np.isfinite(ys)
+        self.total += np.where(finite, ys, 0).sum(axis=0)
+        self.valid += finite.sum(axis=0)
+        self.low = np.fmin(self.low, np.nanmin(np.where(finite, ys, np.inf), axis=0))
+        self.high = np.fmax(self.high, np.nanmax(np.where(finite, ys, -np.inf), axis=0))
+
+        added = len(xs)
+        if self.window: # mirrored ring: every sample is written twice so the latest window is always one contiguous slice
+            xs, ys = xs[-self.window:], ys[-self.window:]
+            idx = (self.count + added - len(xs) + np.arange(len(xs))) % self.window
+            self.x[idx] = xs
+            self.x[idx + self.window] = xs
+            self.y[idx] = ys
+            self.y[idx + self.window] = ys
+        else:
+            if self.count + added > len(self.x): # double the capacity, amortised O(1) per sample
+                size = max(2*len(self.x), self.count + added)
+                self.x = np.resize(self.x, size)
+                self.y = np.resize(self.y, (size, self.y.shape[1]))
+            self.x[self.count:self.count+added] = xs
+            self.y[self.count:self.count+added] = ys
+        self.count += added
+
+    def __len__(self):
+        return min(self.count, self.window) if self.window else self.count
+
+    def view(self): # (x, y) of the stored samples as views into the arrays, no copying
+        if self.window:
+            n = len(self)
+            start = (self.count - n) % self.window
+            return self.x[start:start+n], self.y[start:start+n]
+        return self.x[:self.count], self.y[:self.count]
+
+    def summary(self): # per channel count, mean, min, max over every sample appended
+        mean = np.where(self.valid > 0, self.total / np.maximum(self.valid, 1), np.nan)
+        return {"count": self.count, "valid": self.valid.tolist(), "mean": mean.tolist(),
+                "min": np.where(self.valid > 0, self.low, np.nan).tolist(),
+                "max": np.where(self.valid > 0, self.high, np.nan).tolist()}
+
+
+class MinMaxDecimator: # level of detail for an ever growing series: fixed number of buckets, each keeping its min and max so spikes stay visible
+    def __init__(self, max_points=MAX_PLOT_POINTS):
+        self.max_buckets = max(2, max_points // 2)
+        self.bucket_size = 1                # samples per bucket, doubles whenever the buckets are merged
+        self.buckets = []                   # [count, x of min, min, x of max, max]
+
+    def append(self, x, y):
+        if self.buckets and self.buckets[-1][0] < self.bucket_size:
+            bucket = self.buckets[-1]
+            bucket[0] += 1
+            if y < bucket[2]:
+                bucket[1], bucket[2] = x, y
+            if y > bucket[4]:
+                bucket[3], bucket[4] = x, y
+            return
+        self.buckets.append([1, x, y, x, y])
+        if len(self.buckets) > self.max_buckets:
+            self.merge()
+
+    def extend(self, xs, ys):
+        for x, y in zip(xs, ys):
+            self.append(x, y)
+
+    def merge(self): # pair up neighbouring buckets, amortised O(1) per sample
+        merged = []
+        for a, b in zip(self.buckets[0::2], self.buckets[1::2]):
+            low = a if a[2] <= b[2] else b
+            high = a if a[4] >= b[4] else b
+            merged.append([a[0]+b[0], low[1], low[2], high[3], high[4]])
+        if len(self.buckets) % 2:
+            merged.append(self.buckets[-1])
+        self.buckets = merged
+        self.bucket_size *= 2
+
+    def points(self): # (xs, ys) of the min/max vertices in time order
+        xs, ys = [], []
+        for _, x_low, y_low, x_high, y_high in self.buckets:
+            if x_low == x_high:
+                xs.append(x_low)
+                ys.append(y_low)
+            elif x_low < x_high:
+                xs += [x_low, x_high]
+                ys += [y_low, y_high]
+            else:
+                xs += [x_high, x_low]
+                ys += [y_high, y_low]
+        return xs, ys
+
+
+def extend_xlim(ax, x_first, x_last, headroom=XLIM_HEADROOM): # move the x axis only once data leaves it, returns True if it moved
+    lo, hi = ax.get_xlim()
+    if lo <= x_first and x_last <= hi and not (x_first == 0 and hi == 1 and lo == 0): # (0, 1) is the empty-axes default
+        return False
+    span = max(x_last - x_first, 1.0)
+    ax.set_xlim(x_first, x_last + span*headroom)
+    return True
+
+def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting, and saving the recorded data
+    global running
+    global current_interval
+    global selected_interval
+    global burst_mode
+
+    plt.ion()
+    settings = combinedWindow()
+    if len(settings) == 0:
+        messagebox.showwarning("No Filename","Please retry and submit a filename.")
+        return
+    parsed = parse_settings(settings)
+    p_unit, f_unit = parsed["p_unit"], parsed["f_unit"]
+    p_unit_index, f_unit_index = parsed["p_unit_index"], parsed["f_unit_index"]
+    p_min, p_max, f_min, f_max = parsed["p_min"], parsed["p_max"], parsed["f_min"], parsed["f_max"]
+    sliding = parsed["sliding"]
+    selected_interval = current_interval = parsed["interval"]
+    filename = parsed["filename"]
 
 
     root = tk.Tk()
@@ -506,7 +2392,7 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
     # --- Create figure with GridSpec ---
     fig = plt.figure(figsize=(10,5))
     fig.canvas.manager.set_window_title(filename)
-    gs = GridSpec(1, 2, width_ratios=[3, 1], wspace=0.3)
+    gs = gridspec.GridSpec(1, 2, width_ratios=[3, 1], wspace=0.3)
 
     # --- Main plot on left ---
     ax1 = fig.add_subplot(gs[0, 0])
@@ -516,8 +2402,22 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
     ax2.set_ylabel("Flow ("+str(f_unit)+")", color="tab:orange")
     ax1.set_title("Live Plot of Flows")
 
-    line_p, = ax1.plot([], [], marker="o", color="tab:blue", alpha=0.7)
-    line_f, = ax2.plot([], [], marker="o", color="tab:orange", alpha=0.7)
+    ports = [port1, port2, port3, port4]
+    channels = build_channels(ports, p_unit_index, f_unit_index, p_unit, f_unit)
+    if not channels:
+        messagebox.showerror("Error","Please ensure that all sensors are properly connected.")
+        return
+    pressure_colors = ["tab:blue", "navy", "tab:cyan", "tab:purple"]
+    flow_colors = ["tab:orange", "tab:red", "tab:brown", "gold"]
+    lines = []
+    for c in channels: # one line per port, pressure on the left axis and flow on the right
+        pressure = c["kind"] == "p"
+        colors = pressure_colors if pressure else flow_colors
+        color = colors[sum(1 for line_c in channels[:len(lines)] if line_c["kind"] == c["kind"]) % len(colors)]
+        line, = (ax1 if pressure else ax2).plot([], [], marker="o", color=color, alpha=0.7, label=f"Port {c['port']}: {c['device']}")
+        lines.append(line)
+    if any(sum(1 for other in channels if other["kind"] == c["kind"]) > 1 for c in channels): # key for more than one sensor of a kind, e.g. dual flow meters
+        ax1.legend(handles=lines, loc="upper left", fontsize=8)
     ax1.set_ylim(p_min, p_max)
     ax2.set_ylim(f_min, f_max)
 
@@ -532,14 +2432,18 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
     pressure_text = ax_readout.text(0.5, 0.37, "0.0", fontsize=20, ha='center', color='blue')
     status_text = ax_readout.text(0.5, 0.97, "Stopped", fontsize = 20, ha='center',color='red', fontweight='bold')
     burst_text = ax_readout.text(0.5, 0.2, "Burst mode: Off", fontsize =12, ha='center',color='red')
+    perf_text = None
+    if PERF_OVERLAY:
+        perf_text = ax2.text(0.01, 0.01, "", transform=ax2.transAxes, fontsize=8, family="monospace", # ax2 is drawn over ax1
+                             va="bottom", bbox=dict(facecolor="white", alpha=0.7, edgecolor="none"))
 
     # --- Buttons ---
     ax_start = plt.axes([0.71, 0.05, 0.1, 0.075])
     ax_stop  = plt.axes([0.82, 0.05, 0.1, 0.075])
-    btn_start = Button(ax_start, "Start")
-    btn_stop  = Button(ax_stop, "Stop")
+    btn_start = widgets.Button(ax_start, "Start")
+    btn_stop  = widgets.Button(ax_stop, "Stop")
     ax_burst = plt.axes([0.765, 0.145, 0.1, 0.075])
-    btn_burst = Button(ax_burst, "Burst")
+    btn_burst = widgets.Button(ax_burst, "Burst")
 
     def start(event):
         global running
@@ -566,11 +2470,18 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
         global selected_interval
         global current_interval
         global burst_mode
-        global next_time
 
-        if not burst_mode:
-            next_time = time.time()
-            current_interval = 0.1
+        if adaptive is not None: # already sampling at the burst rate, the button only decides whether every sample is kept
+            burst_mode = adaptive.manual = not burst_mode
+            print("Burst mode enabled" if burst_mode else "Burst mode back to automatic")
+            burst_text.set_text("Burst mode: On" if burst_mode else "Burst mode: Auto")
+            burst_text.set_color("green" if burst_mode else "red")
+            plt.draw()
+        elif not burst_mode:
+            current_interval = BURST_INTERVAL
+            scheduler.set_interval(current_interval, immediate=True) # first burst sample right away
+            if push is not None:
+                push.change_interval(current_interval)
             burst_mode = True
             print("Burst mode enabled")
             burst_text.set_text("Burst mode: On")
@@ -578,6 +2489,9 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
             plt.draw()
         else:
             current_interval = selected_interval
+            scheduler.set_interval(current_interval)
+            if push is not None:
+                push.change_interval(current_interval)
             burst_mode = False
             print("Burst mode disabled")
             burst_text.set_text("Burst mode: Off")
@@ -588,23 +2502,23 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
     btn_stop.on_clicked(stop)
     btn_burst.on_clicked(toggleBurst)
 
-    global next_time
-    next_time = time.time()
-    first_sample = True
-    excelrow = 6
+    adaptive = start_adaptive(channels, current_interval)
+    if adaptive is not None: # sample at the burst rate throughout, adaptive decides which samples are kept
+        current_interval = BURST_INTERVAL
+        burst_text.set_text("Burst mode: Auto")
+    scheduler = TickScheduler(current_interval)
+    push = None
+    streamer = None
 
-    header = ["Time Stamp", "Elapsed Time (s)", "Pressure ("+p_unit+")","Flow Rate ("+f_unit+")"]
+    header = recording_header(channels)
 
     global testnameheader, starttimeheader, pressureIDheader, flowIDheader
 
-    testnameheader = ["Test Name", filename]
-    starttimeheader = ["Test Start", starttime]
-    pressureIDheader = ["Pressure Sensor ID", "IFM PN 7692 Pressure Sensor"]
-    flowIDheader = ["Flow Meter ID", "Keyence FD-H20 Ultrasonic Flow Meter"]
+    testnameheader, starttimeheader, pressureIDheader, flowIDheader = recording_meta(filename, starttime, channels)
 
     file_path = filedialog.asksaveasfilename(
         defaultextension = ".xlsx",
-        filetypes = [("Excel Files", "*.xlsx"), ("All Files","*.*")],
+        filetypes = [("Excel Files", "*.xlsx"), ("FlowPro Recording (long tests)", "*.fpr"), ("All Files","*.*")],
         initialfile = filename,
         title = "Save Excel File As..."
     )
@@ -613,110 +2527,432 @@ def live_plot(x_unit="Time (s)"): # main method for sending, recieving, plotting
         messagebox.showerror("Error: No designated file location, please retry", "File path required")
         return
     
-    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-        pd.DataFrame(columns=testnameheader).to_excel(writer, index = False, startrow=0)
-        pd.DataFrame(columns=starttimeheader).to_excel(writer, index = False, startrow=1)
-        pd.DataFrame(columns=pressureIDheader).to_excel(writer, index = False, startrow=2)
-        pd.DataFrame(columns=flowIDheader).to_excel(writer, index = False, startrow=3)
-        pd.DataFrame(columns=header).to_excel(writer, index = False, startrow=5)
-        worksheet = writer.sheets['Sheet1']
-        for column_cells in worksheet.columns:
-            max_length = 0
-            column_letter = column_cells[0].column_letter
-            for cell in column_cells:
-                try:
-                    cell.alignment = Alignment(horizontal='left', vertical='center')
-                    cell_length = len(str(cell.value))
-                    if cell_length > max_length:
-                        max_length = cell_length
-                except:
-                    pass
-            adjusted_width = max_length
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-        ports = [port1, port2, port3, port4]
-        payloads = [PORT1_PAYLOAD, PORT2_PAYLOAD, PORT3_PAYLOAD, PORT4_PAYLOAD]
-
-        # --- Main loop ---
-        x_data, p_data, f_data = [], [], []
+    recorder = open_recorder(file_path, [testnameheader, starttimeheader, pressureIDheader, flowIDheader], header)
+    try:
+        ring = SampleRing(len(channels))
+        stats = {"missed": 0, "errors": 0, "error": None, "finished": False, "started": None}
+        stop_event = threading.Event()
+        push = start_push(channels, current_interval)
+        streamer = start_streamer(channels, {"test": filename, "start": starttime})
+        sampler = threading.Thread(target=sampler_loop, args=(ring, channels, stop_event, stats, scheduler, push), daemon=True)
+        sampler.start()
+        cursor = 0
+        rate_cursor = 0
+        rate_start = time.monotonic()
+        replay_reported = False
+        dropped_total = 0
+        triggered = False
+        overlay_cursor = 0
+        overlay_start = time.monotonic()
+        test_start = time.monotonic()
+
+        renderer = None
+        if RENDER_MODE == "blit" and fig.canvas.supports_blit:
+            renderer = BlitRenderer(fig, lines + [flow_text, pressure_text] + ([perf_text] if perf_text else []))
+        plt.pause(0.01)
+
+        # --- Main loop: render whatever the sampler has pushed since the last frame ---
+        store = SampleStore(len(channels), window=PLOT_WINDOW if sliding else None)
+        lods = [MinMaxDecimator() for c in channels]
+        pressure_idx = [i for i, c in enumerate(channels) if c["kind"] == "p"]
+        flow_idx = [i for i, c in enumerate(channels) if c["kind"] == "f"]
         while plt.fignum_exists(fig.number):
-            now = time.time()
-            if running and now >= next_time:
-                try:
-                    for i, port in enumerate(ports):
-                        if port != None:
-                            if port[1] != None:
-                                response = requests.post(url, json=payloads[i])
-                                response.raise_for_status()
-                                resp_json = response.json()
-                                raw_hex = resp_json.get("data", {}).get("value")
-                                if port[1] == "f":
-                                    f = decodeFlowKey(raw_hex)[f_unit_index]
-                                else:
-                                    p = decodeFlowKey(raw_hex)[p_unit_index]
-
-                    t = datetime.now()
-
-                    if first_sample:
-                        et = 0.0
-                        start_time = now
-                        next_time = start_time + current_interval
-                        first_sample = False
-                    else:
-                        et = round(time.time() - start_time, 2)
-                        next_time += current_interval
-
-                    try:
-                        df = pd.DataFrame([[t, et, p, f]], columns=header)
-                    except UnboundLocalError:
-                        messagebox.showerror("Error","Please ensure that all sensors are properly connected.")
-                        return
-                    
-                    df.to_excel(writer, index=False, header=False, startrow=excelrow)
-                    excelrow += 1
-
-                    x_data.append(et)
-                    p_data.append(p)
-                    f_data.append(f)
-
-                    # --- Keep sliding window ---
-                    if(sliding):
-                        window_size = 300
-                        if len(x_data) > window_size:
-                            x_data = x_data[-window_size:]
-                            p_data = p_data[-window_size:]
-                            f_data = f_data[-window_size:]
-
-                    # --- Update plots ---
-                    line_p.set_xdata(x_data)
-                    line_p.set_ydata(p_data)
-                    line_f.set_xdata(x_data)
-                    line_f.set_ydata(f_data)
-                    ax1.set_xlim(min(x_data), max(x_data))
-
-                    # --- Update readouts ---
-                    flow_text.set_text(f"{f:.2f}"+f_unit)
-                    pressure_text.set_text(f"{p:.2f}"+p_unit)
+            if stats["error"]:
+                stop_event.set()
+                messagebox.showerror("Error", stats["error"])
+                return
+            cursor, walls, ets, delays, values, dropped = ring.read_since(cursor)
+            if dropped:
+                print(f"GUI fell behind, {dropped} samples were overwritten before being saved")
+                dropped_total += dropped
+            if adaptive is not None:
+                walls, ets, delays, values = adaptive.process(walls, ets, delays, values)
+                if adaptive.bursting != triggered and not burst_mode: # show automatic bursts on the burst readout
+                    triggered = adaptive.bursting
+                    burst_text.set_text("Burst mode: Triggered" if triggered else "Burst mode: Auto")
+                    burst_text.set_color("green" if triggered else "red")
                     plt.draw()
+            if perf_text is not None and time.monotonic() - overlay_start >= PERF_OVERLAY_INTERVAL:
+                perf_text.set_text(perf.overlay_text((ring.written-overlay_cursor)/(time.monotonic()-overlay_start), stats["missed"]))
+                overlay_cursor = ring.written
+                overlay_start = time.monotonic()
+                if not len(ets) and renderer is not None:
+                    renderer.update()
+            if len(ets):
+                with perf.time("record"):
+                    recorder.write_rows([[w, et] + v.tolist() + [d] for w, et, d, v in zip(walls, ets, delays, values)])
+                if streamer is not None:
+                    streamer.publish(walls, ets, delays, values)
+
+                store.extend(ets, values) # keeps only the latest PLOT_WINDOW samples when sliding
+                x_data, y_data = store.view()
+                latest = values[-1]
+
+                # --- Update plots ---
+                for i, line in enumerate(lines):
+                    if(sliding):
+                        line.set_data(x_data, y_data[:, i])
+                    else: # draw a bounded min/max decimation instead of every point
+                        lods[i].extend(ets.tolist(), values[:, i].tolist())
+                        line.set_data(*lods[i].points())
+                        if lods[i].bucket_size > 1 and line.get_marker(): # markers on decimated vertices would be misleading
+                            line.set_marker("")
+                x_moved = extend_xlim(ax1, x_data[0], x_data[-1]) # samples arrive in time order, so the ends are the min and max
+
+                # --- Update readouts ---
+                flow_text.set_text(" | ".join(f"{latest[i]:.2f}" for i in flow_idx)+f_unit if flow_idx else "None")
+                pressure_text.set_text(" | ".join(f"{latest[i]:.2f}" for i in pressure_idx)+p_unit if pressure_idx else "None")
+                with perf.time("draw"):
+                    if renderer is None:
+                        ax1.set_xlim(x_data[0], x_data[-1])
+                        plt.draw()
+                    elif x_moved:
+                        fig.canvas.draw()
+                    else:
+                        renderer.update()
+
+            if stats["finished"] and cursor == ring.written and not replay_reported:
+                replay_seconds = time.monotonic() - (stats["started"] or time.monotonic())
+                print(f"Replay finished: {ring.written} samples in {replay_seconds:.2f}s "
+                      f"({ring.written/max(replay_seconds, 1e-9):.1f} samples/s through decode, record and plot)")
+                replay_reported = True
+                status_text.set_text("Replay finished")
+                plt.draw()
+
+            if time.monotonic() - rate_start >= RATE_REPORT_INTERVAL:
+                if running:
+                    target = f"{1/scheduler.interval:.2f}" if scheduler.interval > 0 else "max"
+                    jitter = scheduler.jitter_stats()
+                    print(f"Achieved {(ring.written-rate_cursor)/(time.monotonic()-rate_start):.2f} samples/s "
+                          f"(target {target}), {stats['missed']} missed deadlines, "
+                          f"tick delay p50/p99 {jitter.get('p50_ms', 0):.2f}/{jitter.get('p99_ms', 0):.2f} ms")
+                    if streamer is not None:
+                        print(streamer.lag_text())
+                rate_cursor = ring.written
+                rate_start = time.monotonic()
+
+            if renderer is None:
+                plt.pause(FRAME_INTERVAL)
+            else:
+                fig.canvas.start_event_loop(FRAME_INTERVAL) # plt.pause would redraw the whole stale figure every frame
+
+        stop_event.set()
+        sampler.join(timeout=2*HTTP_TIMEOUT)
+        if store.count:
+            summary = store.summary()
+            print(f"{summary['count']} samples")
+            for i, c in enumerate(channels):
+                print(f"  {c['label']}: min/mean/max {summary['min'][i]:.2f}/{summary['mean'][i]:.2f}/{summary['max'][i]:.2f}")
+            jitter = scheduler.jitter_stats()
+            if "p50_ms" in jitter:
+                print(f"  tick delay mean/p50/p99/max {jitter['mean_ms']:.2f}/{jitter['p50_ms']:.2f}/"
+                      f"{jitter['p99_ms']:.2f}/{jitter['max_ms']:.2f} ms, {jitter['missed']} missed deadlines")
+            if adaptive is not None:
+                print(f"  {len(adaptive.events)} triggered bursts" + "".join(f"\n    {et:.2f}s {text}" for et, text in adaptive.events))
+            for stage, stage_stats in perf.summary().items():
+                if stage_stats["count"]:
+                    print(f"  {stage:<9} p50/p99 {stage_stats['p50_ms']:.2f}/{stage_stats['p99_ms']:.2f} ms over {stage_stats['count']} calls")
+        if PERF_DUMP:
+            seconds = time.monotonic() - test_start
+            with suppress(OSError):
+                perf.dump(os.path.splitext(file_path)[0] + "_perf.json", test=filename, recording=file_path,
+                          samples=ring.written, seconds=seconds, hz=ring.written/max(seconds, 1e-9),
+                          missed=stats["missed"], errors=stats["errors"], dropped=dropped_total,
+                          jitter=scheduler.jitter_stats(), discovery=last_discovery)
+    finally:
+        if push is not None:
+            push.stop()
+        if streamer is not None:
+            streamer.stop()
+        recorder.close()
+
+    plt.ioff()
+    plt.show()
+    messagebox.showinfo("File Saved", f"File saved to:\n{file_path}")
+
+
+# ---------- Headless ----------
+HEADLESS_SETTINGS = ["pressure_unit", "flow_unit", "interval", "pressure_min", "pressure_max", "flow_min", "flow_max",
+                     "filename", "output", "duration", "count", "master", "triggers"] # keys read from a --config json file
+
+def load_config(path): # settings for --headless from a json file, using the same keys as combinedWindow's results
+    with open(path, "r") as f:
+        config = json.load(f)
+    unknown = set(config) - set(HEADLESS_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown settings in {path}: {', '.join(sorted(unknown))}")
+    return config
+
+
+def range_limits(settings, parsed): # {kind: (low, high)} from parse_settings, None where the operator left a limit empty
+    def limit(key, value):
+        return None if settings.get(key) in (None, "") else value
+    return {"p": (limit("pressure_min", parsed["p_min"]), limit("pressure_max", parsed["p_max"])),
+            "f": (limit("flow_min", parsed["f_min"]), limit("flow_max", parsed["f_max"]))}
+
+
+def out_of_range(values, channels, limits): # samples outside the range_limits the operator set, per channel (empty limits are ignored)
+    counts = []
+    for i, c in enumerate(channels):
+        low, high = limits[c["kind"]]
+        column = values[:, i]
+        outside = np.zeros(len(column), dtype=bool)
+        if low is not None:
+            outside |= column < low
+        if high is not None:
+            outside |= column > high
+        counts.append(int(outside.sum()))
+    return counts
+
+
+def run_headless(settings, output=None, duration=None, count=None, report_interval=RATE_REPORT_INTERVAL, stop_event=None):
+    # acquisition and recording with no gui: never touches tkinter or matplotlib, stops on SIGINT/SIGTERM, duration or sample count
+    global running, current_interval, selected_interval
+    parsed = parse_settings(settings)
+    if parsed["interval"] <= 0 and replay_source is None:
+        raise ValueError(f"interval must be positive, got {settings.get('interval')!r}")
+    limits = range_limits(settings, parsed)
+    filename = parsed["filename"] if settings.get("filename") else "flowpro"
+    selected_interval = current_interval = parsed["interval"]
+    output = output or settings.get("output") or filename + ".xlsx"
+
+    futures = [identify_port(n) for n in (1, 2, 3, 4)]
+    ports = [future.result() for future in futures]
+    channels = build_channels(ports, parsed["p_unit_index"], parsed["f_unit_index"], parsed["p_unit"], parsed["f_unit"])
+    if not channels:
+        print("No pressure or flow sensors found, ensure that all sensors are properly connected.")
+        return None
+    for c in channels:
+        print(f"Port {c['port']}: {c['device']} -> {c['label']}")
 
+    stop_event = stop_event or threading.Event()
+    previous_handlers = {}
+    for sig in (signal.SIGINT, getattr(signal, "SIGTERM", None), getattr(signal, "SIGBREAK", None)):
+        if sig is not None:
+            with suppress(ValueError): # only the main thread may install handlers
+                previous_handlers[sig] = signal.signal(sig, lambda signum, frame: stop_event.set())
 
-                except requests.exceptions.RequestException as e:
-                    print(f"An error occurred: {e}")
-
-            plt.pause(0.01)
+    starttime = datetime.now()
+    recorder = open_recorder(output, recording_meta(filename, starttime, channels), recording_header(channels))
+    ring = SampleRing(len(channels))
+    stats = {"missed": 0, "errors": 0, "error": None, "finished": False, "started": None}
+    triggers = [t if isinstance(t, dict) else parse_trigger(t) for t in settings.get("triggers") or []]
+    adaptive = start_adaptive(channels, current_interval, triggers or None)
+    print(f"Recording to {output} every {current_interval}s, press Ctrl+C to stop")
+    if adaptive is not None: # sample at the burst rate throughout, adaptive decides which samples are kept
+        current_interval = BURST_INTERVAL
+    scheduler = TickScheduler(current_interval)
+    store = SampleStore(len(channels), window=1) # running min/mean/max only
+    ranges = [0] * len(channels)
+    sampler_stop = threading.Event()
+    push = start_push(channels, current_interval)
+    streamer = start_streamer(channels, {"test": filename, "start": starttime})
+    sampler = threading.Thread(target=sampler_loop, args=(ring, channels, sampler_stop, stats, scheduler, push), daemon=True)
+    cursor = 0
+    saved = 0
+    dropped_total = 0
+    running = True
+    test_start = time.monotonic()
+    first_et = last_et = None              # elapsed time of the first and last saved sample, the tick grid they were taken on
+    rate_cursor = 0
+    rate_start = test_start
+    sampler.start()
+    try:
+        while True:
+            stopping = stop_event.wait(HEADLESS_DRAIN_INTERVAL)
+            if duration is not None and time.monotonic() - test_start >= duration:
+                stopping = True
+            if stopping: # let the sampler finish its read so the last sample is saved
+                running = False
+                sampler_stop.set()
+                sampler.join(timeout=2*HTTP_TIMEOUT)
+
+            cursor, walls, ets, delays, values, dropped = ring.read_since(cursor)
+            if dropped:
+                print(f"Recording fell behind, {dropped} samples were overwritten before being saved")
+                dropped_total += dropped
+            if adaptive is not None:
+                walls, ets, delays, values = adaptive.process(walls, ets, delays, values)
+            if count is not None:
+                keep = max(0, count - saved)
+                walls, ets, delays, values = walls[:keep], ets[:keep], delays[:keep], values[:keep]
+            if len(ets):
+                with perf.time("record"):
+                    recorder.write_rows([[w, et] + v.tolist() + [d] for w, et, d, v in zip(walls, ets, delays, values)])
+                if streamer is not None:
+                    streamer.publish(walls, ets, delays, values)
+                store.extend(ets, values)
+                ranges = [total + n for total, n in zip(ranges, out_of_range(values, channels, limits))]
+                saved += len(ets)
+                first_et = ets[0] if first_et is None else first_et
+                last_et = ets[-1]
+
+            if stopping or stats["finished"] or stats["error"] or (count is not None and saved >= count):
+                break
 
-        plt.ioff()
-        plt.show()
-        messagebox.showinfo("File Saved", f"File saved to:\n{file_path}")
+            if time.monotonic() - rate_start >= report_interval:
+                network = perf.summary().get("network", {})
+                print(f"{datetime.now():%H:%M:%S}  {saved} samples  {(ring.written-rate_cursor)/(time.monotonic()-rate_start):.2f} samples/s "
+                      f"(target {f'{1/scheduler.interval:.2f}' if scheduler.interval > 0 else 'max'})  "
+                      f"{stats['missed']} missed  {stats['errors']} errors  network p99 {network.get('p99_ms', 0):.1f} ms"
+                      + ("  (pushed)" if push is not None and push.active else "")
+                      + (f"  {sum(ranges)} out of range" if any(ranges) else ""))
+                if streamer is not None:
+                    print(f"          {streamer.lag_text()}")
+                rate_cursor = ring.written
+                rate_start = time.monotonic()
+        acquired = time.monotonic() # before teardown, closing an xlsx recorder runs the whole export
+    finally:
+        running = False
+        sampler_stop.set()
+        sampler.join(timeout=2*HTTP_TIMEOUT)
+        if push is not None:
+            push.stop()
+        if streamer is not None:
+            streamer.stop()
+        recorder.close()
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+
+    seconds = acquired - test_start
+    span = float(last_et - first_et) if saved > 1 else 0.0
+    result = {"test": filename, "output": output, "samples": saved, "seconds": seconds, "span": span,
+              "hz": (saved-1)/span if span > 0 else saved/max(seconds, 1e-9), # samples per second on the tick grid
+              "teardown_seconds": time.monotonic() - acquired,
+              "missed": stats["missed"], "errors": stats["errors"], "error": stats["error"], "dropped": dropped_total,
+              "pushes": push.pushes if push else 0, "push_lapses": stats.get("push_lapses", 0),
+              "triggers": [{"elapsed": et, "trigger": text} for et, text in adaptive.events] if adaptive else [],
+              "out_of_range": dict(zip([c["label"] for c in channels], ranges)), "jitter": scheduler.jitter_stats(),
+              "file_bytes": os.path.getsize(output) if os.path.exists(output) else None}
+    print(f"{saved} samples in {seconds:.1f}s ({result['hz']:.2f} samples/s), {stats['missed']} missed deadlines, "
+          f"{stats['errors']} errors, saved to {output} in {result['teardown_seconds']:.1f}s")
+    if store.count:
+        summary = store.summary()
+        for i, c in enumerate(channels):
+            print(f"  {c['label']}: min/mean/max {summary['min'][i]:.2f}/{summary['mean'][i]:.2f}/{summary['max'][i]:.2f}"
+                  + (f", {ranges[i]} out of range" if ranges[i] else ""))
+    if PERF_DUMP:
+        with suppress(OSError):
+            perf.dump(os.path.splitext(output)[0] + "_perf.json", discovery=last_discovery, **result)
+    return result
 
 
-    
 if __name__ == "__main__": # on application enter: 
-    found = threaded_find_master() # COMMENT OUT FOR TESTING W/O MASTER
+    parser = argparse.ArgumentParser(description="FlowPro IO-Link data logger")
+    parser.add_argument("--rescan", action="store_true", help="ignore the cached master and scan the subnet")
+    parser.add_argument("--subnet", dest="subnets", action="append", metavar="CIDR",
+                        help=f"subnet to search for masters, repeat for several benches (default {SUBNET})")
+    parser.add_argument("--convert", metavar="FILE.fpr", help="convert a .fpr recording to .xlsx and exit")
+    parser.add_argument("--decimate", type=int, default=1, help="keep every Nth row when converting")
+    parser.add_argument("--capture", metavar="FILE.jsonl", help="record every raw reply from the master")
+    parser.add_argument("--replay", metavar="FILE.jsonl", help="replay a capture instead of talking to a master")
+    parser.add_argument("--fast", action="store_true", help="replay as fast as possible instead of in real time")
+    parser.add_argument("--burst-rate", type=float, default=1/BURST_INTERVAL, help="samples per second while burst mode is on")
+    parser.add_argument("--trigger", dest="triggers", action="append", type=parse_trigger, metavar="KIND:CH:VALUE",
+                        help="burst automatically on rate:CH:PER_S, rise/fall/cross:CH:X or band:CH:LOW:HIGH (CH = pressure, flow or a port), repeatable")
+    parser.add_argument("--pre-trigger", type=float, default=PRE_TRIGGER, help="seconds before a trigger kept at the burst rate")
+    parser.add_argument("--post-trigger", type=float, default=POST_TRIGGER, help="seconds of burst rate after the last trigger")
+    parser.add_argument("--profile-imports", action="store_true", help="print the import time of each heavy module and exit")
+    parser.add_argument("--perf-overlay", action="store_true", help="show achieved Hz and per-stage latency on the plot")
+    parser.add_argument("--push", action="store_true", help="have the master push samples on its timer instead of polling it")
+    parser.add_argument("--push-port", type=int, default=PUSH_LISTEN_PORT, help="local port the master pushes to (0 = any free port)")
+    parser.add_argument("--stream", type=int, metavar="PORT", help="serve live samples at http://HOST:PORT/stream (sse, or ?format=jsonl)")
+    parser.add_argument("--stream-host", default=STREAM_HOST, help="address to serve the stream on, 0.0.0.0 for the whole lan")
+    headless = parser.add_argument_group("headless", "record without the settings window or live plot")
+    headless.add_argument("--headless", action="store_true", help="run from the command line, no tkinter or matplotlib")
+    headless.add_argument("--config", metavar="FILE.json", help="settings file, keys: " + ", ".join(HEADLESS_SETTINGS))
+    headless.add_argument("--master", help="master ip (or ip:port), skips discovery")
+    headless.add_argument("--pressure-unit", choices=["psi", "bar", "kpa"])
+    headless.add_argument("--flow-unit", choices=["l/m", "g/m"])
+    headless.add_argument("--interval", type=float, help="seconds between samples")
+    headless.add_argument("--pressure-min", type=float)
+    headless.add_argument("--pressure-max", type=float)
+    headless.add_argument("--flow-min", type=float)
+    headless.add_argument("--flow-max", type=float)
+    headless.add_argument("--test-name", dest="filename")
+    headless.add_argument("--output", metavar="FILE", help=".xlsx or .fpr recording, defaults to <test name>.xlsx")
+    headless.add_argument("--duration", type=float, help="stop after this many seconds")
+    headless.add_argument("--count", type=int, help="stop after this many samples")
+    headless.add_argument("--masters", nargs="+", metavar="ADDR",
+                          help="poll several masters at once (ADDR or ADDR/1,2 for some ports), json lines to --output or stdout")
+    headless.add_argument("--report-interval", type=float, default=RATE_REPORT_INTERVAL, help="seconds between throughput reports")
+    args = parser.parse_args()
+    if args.profile_imports:
+        profile_imports()
+        sys.exit(0)
+    if args.convert:
+        recording_to_xlsx(args.convert, decimate=args.decimate)
+        sys.exit(0)
+    if args.burst_rate <= 0:
+        parser.error("--burst-rate must be positive")
+    BURST_INTERVAL = 1/args.burst_rate
+    ADAPTIVE_TRIGGERS = args.triggers or []
+    PRE_TRIGGER = args.pre_trigger
+    POST_TRIGGER = args.post_trigger
+    PERF_OVERLAY = args.perf_overlay
+    PUSH_MODE = args.push
+    PUSH_LISTEN_PORT = args.push_port
+    STREAM_PORT = args.stream
+    STREAM_HOST = args.stream_host
+    if args.subnets:
+        for subnet in args.subnets:
+            try:
+                ipaddress.ip_network(subnet, strict=False)
+            except ValueError:
+                parser.error(f"--subnet {subnet} is not a valid CIDR")
+        SUBNETS = args.subnets
+        SUBNET = SUBNETS[0]
+
+    if args.masters:
+        if args.interval is not None and args.interval <= 0:
+            parser.error("--interval must be positive")
+        acquisition = run_multi_master(args.masters, args.interval or 1.0, args.output, args.duration, args.count)
+        sys.exit(0 if all(m.devices for m in acquisition.masters) else 1) # fails only if a master never came up
+
+    if args.headless:
+        settings = load_config(args.config) if args.config else {}
+        for key in HEADLESS_SETTINGS: # command line arguments override the config file
+            if getattr(args, key, None) is not None:
+                settings[key] = getattr(args, key)
+        if not args.replay and parse_settings(settings)["interval"] <= 0:
+            parser.error("--interval (or the config file's interval) must be positive")
+        preload_heavy_modules(HEADLESS_MODULES)
+        if args.replay:
+            replay_source = ReplaySource(args.replay, realtime=not args.fast)
+            found = "replay"
+        else:
+            found = settings.get("master") or find_master()
+        if found is None:
+            print("Could not locate IFM master. Ensure you are on the correct network.")
+            sys.exit(1)
+        url = "http://"+str(found)
+        if args.capture:
+            raw_capture = RawCapture(args.capture)
+        try:
+            result = run_headless(settings, duration=settings.get("duration"), count=settings.get("count"),
+                                  report_interval=args.report_interval)
+        finally:
+            if raw_capture is not None:
+                raw_capture.close()
+        sys.exit(0 if result else 1)
+
+    preload_heavy_modules()
+    if args.replay:
+        replay_source = ReplaySource(args.replay, realtime=not args.fast)
+        close_splash()
+        found = "replay"
+    else:
+        found = find_master() # COMMENT OUT FOR TESTING W/O MASTER
     #found = "10.0.0.2"
     if found is None:
         messagebox.showerror("Error", "Could not locate IFM mater. Ensure you are on the correct network.")
     else:
         url = "http://"+str(found)
-        live_plot()
+        if args.capture:
+            raw_capture = RawCapture(args.capture)
+        try:
+            live_plot()
+        finally:
+            if raw_capture is not None:
+                raw_capture.close()
         
\ No newline at end of file
@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('images', 'images')],
-    hiddenimports=[],
+    hiddenimports=['numpy', 'matplotlib.pyplot', 'matplotlib.widgets', 'matplotlib.gridspec', 'matplotlib.backends.backend_tkagg',
+                   'tkinter', 'tkinter.ttk', 'tkinter.messagebox', 'tkinter.filedialog', 'PIL.Image', 'PIL.ImageTk', 'openpyxl'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -19,7 +20,7 @@ splash = Splash(
     'images/loading.jpg',
     binaries=a.binaries,
     datas=a.datas,
-    text_pos=None,
+    text_pos=(20, 1000),
     text_size=12,
     minify_script=True,
     always_on_top=True,
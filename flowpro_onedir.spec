@@ -0,0 +1,66 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Launch-time tuned build: pyinstaller flowpro_onedir.spec
+# onedir skips the unpack-to-temp step --onefile repeats on every launch, upx is off because decompressing the
+# dlls costs more at startup than it saves on disk, and stacks flowpro no longer uses are excluded.
+# Ship the whole dist/flowpro folder and start dist/flowpro/flowpro.exe.
+# Profile a build with: flowpro.exe --profile-imports (the report is shown and saved as flowpro_import_profile.txt next to the exe)
+# Measured launch to every heavy stack imported (--profile-imports, median of 4 warm launches, Linux x86_64 build):
+#   flowpro.spec --onefile 3.9 s, this onedir build 1.1 s, python flowpro.py 0.8 s; rerun on the bench pc for windows numbers
+# hiddenimports is flowpro.HEAVY_MODULES: they are imported by name through LazyModule, which the analysis cannot see
+
+
+a = Analysis(
+    ['flowpro.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('images', 'images')],
+    hiddenimports=['numpy', 'matplotlib.pyplot', 'matplotlib.widgets', 'matplotlib.gridspec', 'matplotlib.backends.backend_tkagg',
+                   'tkinter', 'tkinter.ttk', 'tkinter.messagebox', 'tkinter.filedialog', 'PIL.Image', 'PIL.ImageTk', 'openpyxl'],
+    hookspath=[],
+    hooksconfig={'matplotlib': {'backends': 'TkAgg'}},
+    runtime_hooks=[],
+    excludes=['pandas', 'scipy', 'IPython', 'jedi', 'notebook', 'pytest', 'setuptools', 'pydoc',
+              'PyQt5', 'PyQt6', 'PySide2', 'PySide6', 'wx', 'gi', 'cairo', 'sqlite3', 'lxml'],
+    noarchive=False,
+    optimize=1,
+)
+pyz = PYZ(a.pure)
+splash = Splash(
+    'images/loading.jpg',
+    binaries=a.binaries,
+    datas=a.datas,
+    text_pos=(20, 1000),
+    text_size=12,
+    minify_script=True,
+    always_on_top=True,
+)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    splash,
+    [],
+    exclude_binaries=True,
+    name='flowpro',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['images\\croppedlogo.ico'],
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    splash.binaries,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='flowpro',
+)
@@ -0,0 +1,292 @@
+import asyncio
+import argparse
+import json
+import math
+import random
+import threading
+import time
+
+# Local stand-in for the IFM IO-Link master JSON interface, used to load test and benchmark FlowPro without hardware.
+# Also answers /timer[1] datachanged subscriptions and pushes pdin to the callback url, for flowpro --push.
+# run with: python master_sim.py --count 100 --base-port 8000 --latency 5 --jitter 2 --fail-rate 0.01
+# then point FlowPro at http://127.0.0.1:8000 .. http://127.0.0.1:8099
+
+# ---------- Globals ----------
+DEFAULT_PORTS = [2015, 452, None, None]   # device id on ports 1-4, matches the deviceIDs table in flowpro.py
+DEVICE_KINDS = {
+    2015: "keyence_flow",
+    2016: "keyence_flow",
+    1463: "ifm_flow",
+    452:  "ifm_pressure",
+    1313: "moneo"
+}
+WAVE_PERIOD = 20.0      # seconds per cycle of the simulated pressure/flow waveforms
+DEFAULT_TIMER_MS = 500  # timer[1] period until a client sets it
+
+# ---------- Waveforms ----------
+
+def encodePressureIFM(bar): # inverse of decodePressureIFM: bar*10 in the middle 28 bits of 4 bytes
+    return format((max(0, int(round(bar*10))) & 0x0FFFFFFF) << 2, '08X')
+
+def encodeFlowKey(L_min): # inverse of decodeFlowKey: L/min*100 as a 32 bit two's complement in the first 4 of 8 bytes
+    return format(int(round(L_min*100)) & 0xFFFFFFFF, '08X') + "00000000"
+
+def encodeFlowIFM(L_min, total=0): # inverse of decodeFlowIFM: totaliser in the first 4 bytes, L/min*60 in the next 4
+    return format(int(total) & 0xFFFFFFFF, '08X') + format(max(0, int(round(L_min*60))) & 0xFFFFFFFF, '08X')
+
+
+def waveform(kind, t, phase): # realistic looking process data for one device at time t
+    wave = math.sin(2*math.pi*(t/WAVE_PERIOD) + phase)
+    if kind == "ifm_pressure":
+        bar = 3.5 + 1.5*wave + random.gauss(0, 0.02)
+        if random.random() < 0.002: # occasional pressure spike
+            bar += 4
+        return encodePressureIFM(bar)
+    if kind == "keyence_flow":
+        return encodeFlowKey(12 + 6*wave + random.gauss(0, 0.1))
+    if kind == "ifm_flow":
+        L_min = 12 + 6*wave + random.gauss(0, 0.1)
+        return encodeFlowIFM(L_min, total=t*12)
+    return "00000000"
+
+# ---------- Simulated Master ----------
+class SimulatedMaster: # one master: answers deviceid / pdin getdata and /getdatamulti over keep-alive http, pushes to subscribers
+    def __init__(self, host, port, device_ids=None, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0):
+        self.host = host
+        self.port = port
+        self.device_ids = list(device_ids or DEFAULT_PORTS)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.phase = random.uniform(0, 2*math.pi)
+        self.start = time.time()
+        self.requests = 0
+        self.failures = 0
+        self.server = None
+        self.timer_ms = DEFAULT_TIMER_MS
+        self.counter = 0
+        self.subscriptions = {}     # callback url -> {"datatosend": [...], "expires": time.time() or None}
+        self.push_enabled = True    # set False to simulate a master that silently stops pushing
+        self.pushes = 0
+        self.timer_task = None
+
+    def pdin(self, portNum):
+        device_id = self.device_ids[portNum-1] if 1 <= portNum <= len(self.device_ids) else None
+        if device_id is None:
+            return None
+        return waveform(DEVICE_KINDS.get(device_id), time.time() - self.start, self.phase)
+
+    def answer(self, request): # build the json reply for one request
+        cid = request.get("cid", -1)
+        adr = request.get("adr", "")
+        if adr == "/getdatamulti":
+            data = {}
+            for item in request.get("data", {}).get("datatosend", []):
+                value = self.pdin(port_number(item)) if item.endswith("/pdin") else None
+                data[item] = {"code": 200, "data": value} if value is not None else {"code": 503}
+            return {"cid": cid, "data": data, "code": 200}
+        if adr.startswith("/timer[1]/"):
+            return self.answer_timer(cid, adr, request.get("data", {}))
+        portNum = port_number(adr)
+        if adr.endswith("/deviceid/getdata"):
+            device_id = self.device_ids[portNum-1] if 1 <= portNum <= len(self.device_ids) else None
+            if device_id is None:
+                return {"cid": cid, "code": 503}
+            return {"cid": cid, "data": {"value": device_id}, "code": 200}
+        if adr.endswith("/pdin/getdata"):
+            value = self.pdin(portNum)
+            if value is None:
+                return {"cid": cid, "code": 503}
+            return {"cid": cid, "data": {"value": value}, "code": 200}
+        return {"cid": cid, "code": 400}
+
+    def answer_timer(self, cid, adr, data): # timer[1] interval get/set and counter/datachanged subscribe/unsubscribe
+        if adr == "/timer[1]/interval/getdata":
+            return {"cid": cid, "data": {"value": self.timer_ms}, "code": 200}
+        if adr == "/timer[1]/interval/setdata":
+            try:
+                self.timer_ms = max(1, int(data["newvalue"]))
+            except (KeyError, TypeError, ValueError):
+                return {"cid": cid, "code": 400}
+            return {"cid": cid, "code": 200}
+        if adr == "/timer[1]/counter/datachanged/subscribe":
+            callback = data.get("callback")
+            if not callback or not callback.startswith("http://"):
+                return {"cid": cid, "code": 400}
+            duration = data.get("duration", "lifetime")
+            expires = None if duration == "lifetime" else time.time() + float(duration)
+            self.subscriptions[callback] = {"datatosend": list(data.get("datatosend", [])), "expires": expires}
+            return {"cid": cid, "code": 200}
+        if adr == "/timer[1]/counter/datachanged/unsubscribe":
+            self.subscriptions.pop(data.get("callback"), None)
+            return {"cid": cid, "code": 200}
+        return {"cid": cid, "code": 400}
+
+    async def push_loop(self): # every timer tick post the subscribed data to each live callback
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.timer_ms / 1000
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            if loop.time() - next_tick > 1.0: # timer changed or the loop stalled, restart the grid
+                next_tick = loop.time()
+            self.counter += 1
+            now = time.time()
+            for callback, sub in list(self.subscriptions.items()):
+                if sub["expires"] is not None and now > sub["expires"]:
+                    del self.subscriptions[callback]
+                    continue
+                if self.push_enabled:
+                    payload = {"/timer[1]/counter": {"code": 200, "data": self.counter}}
+                    for item in sub["datatosend"]:
+                        value = self.pdin(port_number(item)) if item.endswith("/pdin") else None
+                        payload[item] = {"code": 200, "data": value} if value is not None else {"code": 503}
+                    event = {"code": "event", "cid": -1, "adr": "",
+                             "data": {"eventno": str(self.counter), "srcurl": "/timer[1]/counter/datachanged", "payload": payload}}
+                    asyncio.ensure_future(self.deliver(callback, event))
+
+    async def deliver(self, callback, event): # post one event, an unreachable subscriber just misses it
+        host, _, rest = callback[len("http://"):].partition(":")
+        port, _, path = rest.partition("/")
+        body = json.dumps(event).encode()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port or 80)), 2)
+            writer.write((f"POST /{path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode() + body)
+            await writer.drain()
+            await asyncio.wait_for(reader.readline(), 2)
+            writer.close()
+            self.pushes += 1
+        except (OSError, ValueError, asyncio.TimeoutError):
+            pass
+
+    async def handle(self, reader, writer): # serve requests on one keep-alive connection until the client closes it
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length) if length else b"{}"
+                self.requests += 1
+
+                delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+                if delay:
+                    await asyncio.sleep(delay)
+                if random.random() < self.fail_rate:
+                    self.failures += 1
+                    if random.random() < 0.5: # half the failures drop the connection, half return a server error
+                        break
+                    writer.write(b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\n\r\n")
+                    await writer.drain()
+                    continue
+
+                try:
+                    reply = json.dumps(self.answer(json.loads(body))).encode()
+                except ValueError:
+                    reply = json.dumps({"cid": -1, "code": 400}).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: "
+                             + str(len(reply)).encode() + b"\r\n\r\n" + reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start_server(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.timer_task = asyncio.ensure_future(self.push_loop())
+        return self.server
+
+
+def port_number(adr): # "/iolinkmaster/port[3]/..." -> 3
+    try:
+        return int(adr.split("port[", 1)[1].split("]", 1)[0])
+    except (IndexError, ValueError):
+        return 0
+
+
+def build_masters(count=1, host="127.0.0.1", base_port=8000, spread=False, device_ids=None,
+                  latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0): # spread puts each master on its own 127.0.0.x address instead of its own port
+    masters = []
+    for i in range(count):
+        if spread:
+            master_host, master_port = f"127.0.0.{i+1}", base_port
+        else:
+            master_host, master_port = host, base_port + i
+        masters.append(SimulatedMaster(master_host, master_port, device_ids, latency_ms, jitter_ms, fail_rate))
+    return masters
+
+
+async def serve(masters, report_interval=None): # run every master until cancelled
+    for master in masters:
+        await master.start_server()
+    print(f"Simulating {len(masters)} masters: {masters[0].host}:{masters[0].port} .. {masters[-1].host}:{masters[-1].port}")
+    while True:
+        await asyncio.sleep(report_interval or 3600)
+        if report_interval:
+            print(f"{sum(m.requests for m in masters)} requests, {sum(m.failures for m in masters)} injected failures")
+
+
+def run_in_thread(**kwargs): # start masters on a background event loop, returns (addresses, masters, stop)
+    masters = build_masters(**kwargs)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def main():
+        for master in masters:
+            await master.start_server()
+        ready.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(main()), daemon=True)
+    thread.start()
+    ready.wait(10)
+
+    def stop():
+        def close_all():
+            for master in masters:
+                master.server.close()
+            for task in asyncio.all_tasks(loop):
+                task.cancel()
+        loop.call_soon_threadsafe(close_all)
+        thread.join(timeout=5)
+
+    return [f"{m.host}:{m.port}" for m in masters], masters, stop
+
+
+def parse_ports(text): # "2015,452,none,none" -> [2015, 452, None, None]
+    return [None if v.strip().lower() in ("", "none", "0") else int(v) for v in text.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated IFM IO-Link masters for FlowPro load testing")
+    parser.add_argument("--count", type=int, default=1, help="number of masters to simulate")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8000, help="first tcp port, one port per master")
+    parser.add_argument("--spread", action="store_true", help="one 127.0.0.x address per master on --base-port instead")
+    parser.add_argument("--ports", type=parse_ports, default=DEFAULT_PORTS, help="device ids on ports 1-4, e.g. 2015,452,none,none")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean reply latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency standard deviation in ms")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests that fail (0-1)")
+    parser.add_argument("--report", type=float, default=10.0, help="seconds between request count reports")
+    args = parser.parse_args()
+
+    for device_id in args.ports:
+        if device_id is not None and device_id not in DEVICE_KINDS:
+            parser.error(f"unknown device id {device_id}, choose from {sorted(DEVICE_KINDS)}")
+    sim = build_masters(args.count, args.host, args.base_port, args.spread, args.ports, args.latency, args.jitter, args.fail_rate)
+    try:
+        asyncio.run(serve(sim, args.report))
+    except KeyboardInterrupt:
+        pass